@@ -3,7 +3,8 @@
 Firestore/Storage integration for persisting projects.
 - No per-user filtering.
 - Debounced saves.
-- Offloads 'products_data' AND 'filter_options' to JSON in Storage.
+- Stores each product as a doc in projects/{id}/products; saves write only changed products.
+- Offloads 'filter_options' to gzipped JSON in Storage (legacy projects: products too, still readable).
 - OPTIMIZED: Assumes Public Bucket (allUsers=Viewer).
 - NEW: AUTO-REPAIR feature fixes broken 'gs://' links from old uploads on the fly.
 """
@@ -11,42 +12,104 @@ Firestore/Storage integration for persisting projects.
 from __future__ import annotations
 
 import os
-import time
+import gzip
+import hashlib
+import io
+import sys
+import copy
+import functools
 import json
+import queue
+import re
+import threading
+import time
 import urllib.parse
-from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timezone
 from typing import Dict, List, Optional
 
+import requests
 import streamlit as st
+from google.api_core.exceptions import Aborted, FailedPrecondition, GoogleAPICallError, NotFound
 from google.cloud import firestore, storage
 from google.oauth2 import service_account
 
+try:
+    import orjson
+except ImportError:  # optional: falls back to the stdlib json module
+    orjson = None
+
 # =========================
 # Small utilities
 # =========================
 
+# Image URLs carry the object generation, so the cached object is never stale.
+IMAGE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+GZIP_MAGIC = b"\x1f\x8b"
+
+# save_project's result when another writer changed the project since it was loaded.
+SAVE_CONFLICT = {"conflict": True}
+
+# Concurrent GCS requests per save (uploads are latency-bound, not CPU-bound).
+UPLOAD_WORKERS = 20
+
+# Project-doc fields list_projects needs (product_count/num_* are maintained by save_project).
+SUMMARY_FIELDS = ["id", "name", "description", "created_date", "last_modified",
+                  "product_count", "num_attributes", "num_pending_changes"]
+
+# Sub-requests per GCS multipart batch.
+GCS_BATCH_SIZE = 100
+
+# Uploads above this size go resumable, in chunks of this size (a multiple of 256 KiB).
+RESUMABLE_UPLOAD_THRESHOLD = 4 * 1024 * 1024
+
+# Attempts per document before a BulkWriter gives up on it and reports it as failed.
+BULK_WRITE_MAX_ATTEMPTS = 5
+
+def _norm_pid(value) -> str:
+    """Lowercased, stripped product id; interned so repeated dict lookups compare by identity."""
+    return sys.intern(str(value).lower().strip())
+
+# https://storage.googleapis.com/<bucket>/<path>[?query] (also the console's storage.cloud.google.com)
+_GCS_HTTP_URL_RE = re.compile(r"^https?://storage\.(?:googleapis|cloud\.google)\.com/([^/?]+)/([^?]+)")
+
+@functools.lru_cache(maxsize=8192)
 def _blob_path_from_url(url: str, bucket_name: str) -> Optional[str]:
-    if not isinstance(url, str): return None
-    u = url.strip().split('?')[0]
-    if not u: return None
-    
-    # Handle gs:// format
-    if u.startswith("gs://"):
-        rest = u[len("gs://"):]
-        if "/" in rest and rest.split("/", 1)[0] == bucket_name:
-            return rest.split("/", 1)[1]
-            
-    # Handle https:// format
-    if "storage.googleapis.com" in u:
-        try:
-            decoded = urllib.parse.unquote(u)
-            after = decoded.split("storage.googleapis.com/", 1)[1]
-            parts = after.split("/", 1)
-            if parts[0] == bucket_name:
-                return parts[1]
-        except: pass
+    u = url.strip()
+    gs_prefix = f"gs://{bucket_name}/"
+    if u.startswith(gs_prefix): return u[len(gs_prefix):].partition('?')[0]
+    m = _GCS_HTTP_URL_RE.match(u)
+    if m and m.group(1) == bucket_name: return urllib.parse.unquote(m.group(2))
     return None
 
+def _json_dumps(obj, sort_keys: bool = False) -> bytes:
+    """Compact UTF-8 JSON; uses orjson when installed."""
+    if orjson is not None:
+        option = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+        if sort_keys: option |= orjson.OPT_SORT_KEYS
+        return orjson.dumps(obj, default=str, option=option)
+    return json.dumps(obj, sort_keys=sort_keys, default=str, separators=(",", ":")).encode('utf-8')
+
+def _gzip_json(obj) -> bytes:
+    """
+    Gzipped compact JSON. Without orjson the stdlib encoder streams chunks straight into the
+    compressor, so the uncompressed document is never held in memory as one string.
+    """
+    if orjson is not None:
+        return gzip.compress(_json_dumps(obj), compresslevel=6)
+    buf = io.BytesIO()
+    with gzip.GzipFile(fileobj=buf, mode="wb", compresslevel=6) as gz:
+        for chunk in json.JSONEncoder(default=str, separators=(",", ":")).iterencode(obj):
+            gz.write(chunk.encode("utf-8"))
+    return buf.getvalue()
+
+def _loads_json_blob(data: bytes):
+    """Parses a JSON blob, gzipped or not (the transport may or may not have decompressed it)."""
+    if data[:2] == GZIP_MAGIC: data = gzip.decompress(data)
+    # Both parsers accept UTF-8 bytes directly; skipping .decode() avoids a full str copy
+    return orjson.loads(data) if orjson is not None else json.loads(data)
+
 def _normalize_pem(pem: str) -> str:
     pem = (pem or "").replace("\r", "")
     if "\\n" in pem and "\n" not in pem: pem = pem.replace("\\n", "\n")
@@ -58,6 +121,13 @@ def _normalize_pem(pem: str) -> str:
 # =========================
 
 class ProjectFirestoreManager:
+    """
+    Persists projects to Firestore (metadata) and Cloud Storage (blobs).
+
+    The bucket must be publicly readable (IAM: allUsers -> roles/storage.objectViewer).
+    Uploads never call blob.make_public(); URLs are built directly from the blob path.
+    """
+
     def __init__(self, *, firebase_config_json_path=None, creds=None, project_id=None, bucket_name=None):
         if firebase_config_json_path:
             self.db = firestore.Client.from_service_account_json(firebase_config_json_path)
@@ -68,74 +138,293 @@ class ProjectFirestoreManager:
         else:
             raise ValueError("Invalid Firebase Config")
         
+        # The default urllib3 pool keeps 10 connections; size it for the upload pool so
+        # concurrent uploads reuse keep-alive TLS connections instead of discarding them.
+        adapter = requests.adapters.HTTPAdapter(pool_connections=UPLOAD_WORKERS, pool_maxsize=UPLOAD_WORKERS, max_retries=3)
+        self.storage_client._http.mount("https://", adapter)
+
         if not bucket_name: raise ValueError("bucket_name is required")
         self.bucket_name = bucket_name
+        self._gs_prefix = f"gs://{bucket_name}/"
+        self._bkt = self.storage_client.bucket(bucket_name)
         self.collection_name = "projects"
-        self._saving_in_progress = False
-
-    def _bucket(self): return self.storage_client.bucket(self.bucket_name)
+        # Shared by all sessions: guard per project, not per manager
+        self._saving_lock = threading.Lock()
+        self._saving_projects = set()
+        # project_id -> {product doc id: fingerprint} as last read from / written to Firestore
+        self._product_snapshots: Dict[str, Dict[str, bytes]] = {}
+        # Same idea for the project doc's top-level fields and the filter_options blob
+        self._doc_snapshots: Dict[str, Dict[str, bytes]] = {}
+        self._options_snapshots: Dict[str, bytes] = {}
+
+    def _bucket(self): return self._bkt
     def _image_blob_path(self, pid, name): return f"projects/{pid}/images/{name}"
+    def _thumb_blob_path(self, pid, name): return f"projects/{pid}/images/thumbs/{os.path.splitext(name)[0]}.jpg"
     def _excel_blob_path(self, pid, name): return f"projects/{pid}/{name}"
 
-    def _upload_bytes(self, blob_path, data, content_type):
-        """Uploads bytes and returns a valid HTTPS URL. assumes bucket is public."""
-        blob = self._bucket().blob(blob_path)
+    def _public_url(self, blob_path):
+        """HTTPS URL for a blob (SDK-encoded). Relies on the bucket-level public read policy."""
+        return self._bkt.blob(blob_path).public_url
+
+    def _blob_path_from_url(self, url: str) -> Optional[str]:
+        """Blob path for a gs:// or https:// URL in this bucket, else None."""
+        if not isinstance(url, str): return None
+        return _blob_path_from_url(url, self.bucket_name)
+
+    def _upload_bytes(self, blob_path, data, content_type, content_encoding=None):
+        """Uploads bytes and returns a valid HTTPS URL. No per-object ACL call (bucket is public)."""
+        blob = self._bkt.blob(blob_path)
+        if content_encoding: blob.content_encoding = content_encoding
+        if len(data) > RESUMABLE_UPLOAD_THRESHOLD:
+            # Large payloads (big grids/blobs): chunked resumable upload instead of one multipart PUT
+            blob.chunk_size = RESUMABLE_UPLOAD_THRESHOLD
+            blob.upload_from_file(io.BytesIO(data), size=len(data), content_type=content_type, rewind=True, timeout=120)
+        else:
+            blob.upload_from_string(data, content_type=content_type)
+        return blob.public_url
+
+    def _upload_image(self, blob_path, data, content_type):
+        """
+        Uploads an image with a long-lived Cache-Control and returns its URL keyed on
+        the object generation, so the URL only changes when the bytes change.
+        """
+        blob = self._bkt.blob(blob_path)
+        blob.cache_control = IMAGE_CACHE_CONTROL  # sent with the upload, no extra patch() call
         blob.upload_from_string(data, content_type=content_type)
-        return f"https://storage.googleapis.com/{self.bucket_name}/{urllib.parse.quote(blob_path)}"
+        return f"{blob.public_url}?v={blob.generation}"
+
+    def _upload_json(self, blob_path, obj):
+        """Uploads obj as gzip-compressed JSON (Content-Encoding: gzip)."""
+        data = _gzip_json(obj)
+        return self._upload_bytes(blob_path, data, "application/json", content_encoding="gzip")
+
+    def _delete_blob_quietly(self, blob_path):
+        """Deletes a blob; an already-missing blob is fine, any other error propagates."""
+        try: self._bkt.blob(blob_path).delete()
+        except NotFound: pass
+
+    def _delete_blobs(self, blob_paths):
+        """Deletes blobs in multipart batch requests; a failed batch is retried one blob at a time."""
+        paths = list(blob_paths)
+        bucket = self._bkt
+        for i in range(0, len(paths), GCS_BATCH_SIZE):
+            chunk = paths[i:i + GCS_BATCH_SIZE]
+            try:
+                with self.storage_client.batch():
+                    for path in chunk:
+                        bucket.blob(path).delete()
+            except GoogleAPICallError:
+                # e.g. one object already gone (404) fails the whole batch
+                for path in chunk:
+                    self._delete_blob_quietly(path)
 
     def _download_blob_bytes(self, blob_path):
-        try: return self._bucket().blob(blob_path).download_as_bytes()
-        except: return None
+        """Blob bytes, or None if the object does not exist. Other errors propagate."""
+        if not blob_path: return None
+        try:
+            # raw_download=False lets the transport undo Content-Encoding: gzip inline
+            return self._bkt.blob(blob_path).download_as_bytes(raw_download=False)
+        except NotFound:
+            return None
+
+    # ---------- Products subcollection ----------
+
+    def _bulk_writer(self, failed: set):
+        """
+        BulkWriter that retries a failed write a few times. close() does not raise for the
+        writes it then gives up on, so their document ids are added to `failed` instead.
+        """
+        def on_error(failure, _writer):
+            if failure.attempts < BULK_WRITE_MAX_ATTEMPTS: return True
+            failed.add(failure.operation.reference.id)
+            return False
+
+        writer = self.db.bulk_writer()
+        writer.on_write_error(on_error)
+        return writer
+
+    def _products_ref(self, project_id):
+        return self.db.collection(self.collection_name).document(project_id).collection("products")
+
+    @staticmethod
+    def _product_doc_id(product, position):
+        idx = product.get("original_index")
+        return str(idx if idx is not None else position)
+
+    @staticmethod
+    def _product_fingerprint(product):
+        # Serialized form: immune to later in-place edits of the session's product dicts
+        return _json_dumps(product, sort_keys=True)
+
+    def _load_products(self, project_id) -> List[Dict]:
+        snapshot, products = {}, []
+        for d in self._products_ref(project_id).stream():
+            p = d.to_dict() or {}
+            snapshot[d.id] = self._product_fingerprint(p)
+            products.append(p)
+        self._product_snapshots[project_id] = snapshot
+        products.sort(key=lambda p: (not isinstance(p.get("original_index"), int), p.get("original_index", 0)))
+        return products
+
+    def _sync_products(self, project_id, products):
+        """Writes only products that changed since the last load/save and deletes removed ones."""
+        ref = self._products_ref(project_id)
+        snapshot = self._product_snapshots.get(project_id)
+        if snapshot is None:
+            # Unknown remote state (not loaded/saved by this manager yet): overwrite all, prune stale ids
+            snapshot = {d.id: None for d in ref.list_documents()}
+
+        current, failed = {}, set()
+        writer = self._bulk_writer(failed)
+        for i, p in enumerate(products):
+            doc_id = self._product_doc_id(p, i)
+            current[doc_id] = self._product_fingerprint(p)
+            if snapshot.get(doc_id) != current[doc_id]:
+                writer.set(ref.document(doc_id), p)
+        for doc_id in snapshot.keys() - current.keys():
+            writer.delete(ref.document(doc_id))
+        writer.close()
+
+        # Remote state of a failed doc is unknown: None makes the next save write (or delete) it again
+        for doc_id in failed:
+            current[doc_id] = None
+        self._product_snapshots[project_id] = current
+        if failed:
+            raise RuntimeError(f"{len(failed)} product(s) could not be written")
+
+    # ---------- Project document ----------
+
+    @staticmethod
+    def _doc_fingerprints(doc_data: Dict) -> Dict[str, bytes]:
+        return {k: _json_dumps(v, sort_keys=True) for k, v in doc_data.items()}
+
+    def _write_project_doc(self, project_id, firestore_data, expected_update_time=None):
+        """
+        Sends only the top-level fields that differ from the last loaded/saved version.
+        update() replaces each listed field whole (set(merge=True) would deep-merge maps and
+        keep deleted keys); fields not in firestore_data are left untouched.
+        With expected_update_time every write is an update that only lands if nobody else
+        wrote the doc since (raises FailedPrecondition otherwise, also if the doc was deleted);
+        only a project without a token is written with an unconditional set().
+        Returns the new update time.
+        """
+        doc_ref = self.db.collection(self.collection_name).document(project_id)
+        fingerprints = self._doc_fingerprints(firestore_data)
+        previous = self._doc_snapshots.get(project_id)
+        changed = firestore_data if previous is None else {
+            k: firestore_data[k] for k, fp in fingerprints.items() if previous.get(k) != fp
+        }
+        option = self.db.write_option(last_update_time=expected_update_time) if expected_update_time else None
+        result = None
+        if previous is None and option is None:
+            result = doc_ref.set(firestore_data)
+        elif changed:
+            try:
+                result = doc_ref.update(changed, option=option)
+            except NotFound:
+                if option: raise FailedPrecondition("project was deleted elsewhere")
+                result = doc_ref.set(firestore_data)
+        self._doc_snapshots[project_id] = {**(previous or {}), **fingerprints}
+        return result.update_time if result else expected_update_time
 
     # ---------- CRUD ----------
 
+    def _write_products(self, project_id, products, project_data, options_path) -> bool:
+        """Products subcollection plus the filter_options blob; reports a failure and returns False."""
+        try:
+            with ThreadPoolExecutor(max_workers=2) as pool:
+                products_future = pool.submit(self._sync_products, project_id, products)
+
+                # filter_options can outgrow the 1MB doc limit, so it stays offloaded to Storage
+                options = project_data.get("filter_options", {})
+                options_fp = _json_dumps(options, sort_keys=True)
+                options_future = None
+                if self._options_snapshots.get(project_id) != options_fp:
+                    options_future = pool.submit(self._upload_json, options_path, options)
+
+                products_future.result()
+                if options_future:
+                    options_future.result()
+                    self._options_snapshots[project_id] = options_fp
+            return True
+        except Exception as e:
+            st.error(f"Failed to save products: {e}")
+            return False
+
     def save_project(self, project_id: str, project_data: Dict) -> bool | Dict:
-        if self._saving_in_progress: return False
-        self._saving_in_progress = True
+        with self._saving_lock:
+            if project_id in self._saving_projects: return False
+            self._saving_projects.add(project_id)
 
         try:
-            # 1. Prepare Base Data
+            # 0. Optimistic concurrency: refuse to save over a version we never loaded. This read
+            # only fails fast (before any upload); the guarded doc write in step 7 is the real check.
+            expected_update_time = project_data.get("_update_time")
+            if expected_update_time is not None:
+                current = self.db.collection(self.collection_name).document(project_id).get(field_paths=["id"])
+                if current.exists and current.update_time != expected_update_time:
+                    raise FailedPrecondition("project was modified elsewhere")
+
+            # 1. Prepare Base Data (UTC so last_modified sorts consistently across timezones)
+            now_iso = datetime.now(timezone.utc).isoformat()
             firestore_data = {
                 "id": project_id,
                 "name": project_data.get("name", ""),
                 "description": project_data.get("description", ""),
-                "created_date": project_data.get("created_date", datetime.now().isoformat()),
-                "last_modified": datetime.now().isoformat(),
+                "created_date": project_data.get("created_date", now_iso),
+                "last_modified": now_iso,
                 "attributes": project_data.get("attributes", []),
                 "distributions": project_data.get("distributions", []),
                 "filter_options": {}, 
                 "pending_changes": project_data.get("pending_changes", {}),
                 "excel_filename": project_data.get("excel_filename"),
+                # Denormalized counts so list_projects can use a projection query
+                "num_attributes": len(project_data.get("attributes", [])),
+                "num_pending_changes": len(project_data.get("pending_changes", {})),
             }
 
             # 2. Get Old Mappings (To identify what needs deletion)
-            old_mappings_raw = project_data.get("image_mappings", {})
-            old_mappings = {}
-            for k, v in old_mappings_raw.items():
-                key = str(k).lower().strip()
-                if isinstance(v, dict): old_mappings[key] = v
-                elif isinstance(v, str): old_mappings[key] = {"public_url": v}
+            old_mappings = {
+                _norm_pid(k): (v if isinstance(v, dict) else {"public_url": v})
+                for k, v in project_data.get("image_mappings", {}).items()
+                if isinstance(v, (dict, str))
+            }
 
             # 3. Process Current Products & Build New Mappings
+            # Pass 1 only plans the uploads; the network work happens in pass 2.
             new_mappings = {}
             products_for_storage = []
+            uploads = []  # (pid_lower, pcopy, blob_path, img_bytes, content_type, variant)
             
             for product in project_data.get("products_data", []):
                 pcopy = dict(product)
                 img_info = pcopy.pop("image_data", None)
-                pid_lower = str(pcopy.get("product_id", "")).lower().strip()
+                pid_lower = pcopy.pop("_pid_norm", None) or _norm_pid(pcopy.get("product_id", ""))
 
                 # A. Handle New Uploads (Bytes)
                 if img_info and (isinstance(img_info, bytes) or isinstance(img_info, tuple)):
-                    if isinstance(img_info, tuple): image_name, img_bytes = img_info
+                    # (name, bytes) or (name, bytes, card_thumbnail_bytes)
+                    thumb_bytes = None
+                    if isinstance(img_info, tuple): image_name, img_bytes, thumb_bytes = (img_info + (None,))[:3]
                     else: img_bytes = img_info; image_name = f"{pcopy.get('product_id', 'unnamed')}.png"
                     
-                    blob_path = self._image_blob_path(project_id, image_name)
-                    content_type = "image/png" if image_name.lower().endswith(".png") else "image/jpeg"
-                    base_url = self._upload_bytes(blob_path, img_bytes, content_type)
-                    
-                    pcopy["image_url"] = f"{base_url}?t={int(time.time())}"
-                    new_mappings[pid_lower] = {"blob_path": blob_path, "public_url": pcopy["image_url"]}
+                    sha = hashlib.blake2b(img_bytes, digest_size=16).hexdigest()
+                    old_meta = old_mappings.get(pid_lower, {})
+                    if old_meta.get("sha") == sha and old_meta.get("public_url") and (old_meta.get("thumb_url") or not thumb_bytes):
+                        # Same bytes as the stored image: keep its URLs, skip the upload
+                        new_mappings[pid_lower] = old_meta
+                        pcopy["image_url"] = old_meta["public_url"]
+                        if old_meta.get("thumb_url"): pcopy["thumb_url"] = old_meta["thumb_url"]
+                    else:
+                        blob_path = self._image_blob_path(project_id, image_name)
+                        content_type = "image/png" if image_name.lower().endswith(".png") else "image/jpeg"
+                        uploads.append((pid_lower, pcopy, blob_path, img_bytes, content_type, "image"))
+                        new_mappings[pid_lower] = {"blob_path": blob_path, "sha": sha}
+                        pcopy.pop("thumb_url", None)  # belonged to the replaced image
+                        if thumb_bytes:
+                            thumb_path = self._thumb_blob_path(project_id, image_name)
+                            uploads.append((pid_lower, pcopy, thumb_path, thumb_bytes, "image/jpeg", "thumb"))
+                            new_mappings[pid_lower]["thumb_blob_path"] = thumb_path
 
                 # B. Handle Existing URLs (Preserve mapping)
                 elif pid_lower in old_mappings:
@@ -144,76 +433,138 @@ class ProjectFirestoreManager:
                     # Ensure the product URL matches the mapping
                     if "public_url" in new_mappings[pid_lower]:
                         pcopy["image_url"] = new_mappings[pid_lower]["public_url"]
+                    if "thumb_url" in new_mappings[pid_lower]:
+                        pcopy["thumb_url"] = new_mappings[pid_lower]["thumb_url"]
 
                 products_for_storage.append(pcopy)
 
             # 4. Garbage Collection (Delete Orphaned Images)
-            # Compare Old vs New. If it was in Old but NOT in New, delete it.
+            # Compare Old vs New. Deleted products and replaced images (blob path changed, or a
+            # replacement without a thumbnail) leave orphans; never delete a path that is about
+            # to be uploaded again.
+            upload_paths = {u[2] for u in uploads}
+            stale_paths = set()
             for pid, old_meta in old_mappings.items():
-                # Case 1: Product completely deleted
-                if pid not in new_mappings:
-                    path = old_meta.get("blob_path")
-                    if path:
-                        try: self._bucket().blob(path).delete()
-                        except: pass
-                
-                # Case 2: Product exists, but image was replaced (Blob path changed)
-                elif pid in new_mappings:
-                    old_path = old_meta.get("blob_path")
-                    new_path = new_mappings[pid].get("blob_path")
-                    if old_path and new_path and old_path != new_path:
-                        try: self._bucket().blob(old_path).delete()
-                        except: pass
-
-            # 5. Offload Large Data
-            try:
-                large_data_payload = {
-                    "products": products_for_storage,
-                    "filter_options": project_data.get("filter_options", {})
+                new_meta = new_mappings.get(pid)
+                if new_meta is old_meta: continue  # mapping kept as is
+                for path_key in ("blob_path", "thumb_blob_path"):
+                    old_path = old_meta.get(path_key)
+                    if not old_path or old_path in upload_paths: continue
+                    if new_meta is None or new_meta.get(path_key) != old_path:
+                        stale_paths.add(old_path)
+
+            # Pass 2: one pool for the uploads of this save. Excel and images start together;
+            # products and filter_options are written around the guarded doc write (step 7), and
+            # orphans are deleted only once the doc no longer needs them.
+            with ThreadPoolExecutor(max_workers=UPLOAD_WORKERS) as pool:
+                # 6. Excel (independent of everything else)
+                excel_future = None
+                excel_bytes = project_data.get("excel_file_data")
+                if excel_bytes:
+                    excel_path = self._excel_blob_path(project_id, project_data.get("excel_filename") or "grid.xlsx")
+                    excel_future = pool.submit(self._upload_bytes, excel_path, excel_bytes,
+                                               "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
+
+                futures = {
+                    pool.submit(self._upload_image, blob_path, img_bytes, content_type): (pid_lower, pcopy, variant)
+                    for pid_lower, pcopy, blob_path, img_bytes, content_type, variant in uploads
                 }
-                products_json = json.dumps(large_data_payload)
-                json_path = f"projects/{project_id}/products_data.json"
-                self._upload_bytes(json_path, products_json.encode('utf-8'), "application/json")
-                
-                firestore_data["products_blob_path"] = json_path
-                firestore_data["products_data"] = [] 
-                firestore_data["product_count"] = len(products_for_storage) 
-            except Exception as e:
-                st.error(f"Failed to upload data file: {e}")
+                for fut in as_completed(futures):
+                    pid_lower, pcopy, variant = futures[fut]
+                    if variant == "thumb":
+                        pcopy["thumb_url"] = new_mappings[pid_lower]["thumb_url"] = fut.result()
+                    else:
+                        pcopy["image_url"] = new_mappings[pid_lower]["public_url"] = fut.result()
+
+                options_path = f"projects/{project_id}/filter_options.json.gz"
+                firestore_data["products_storage"] = "subcollection"
+                firestore_data["products_data"] = []
+                firestore_data["product_count"] = len(products_for_storage)
+                firestore_data["filter_options_blob_path"] = options_path
+                firestore_data["image_mappings"] = new_mappings
+
+                if excel_future:
+                    firestore_data["excel_blob_path"] = excel_path
+                    firestore_data["excel_url"] = excel_future.result()
+
+            # 5. Products -> one document each in the "products" subcollection (only diffs are written).
+            # The precondition on the doc write (7) guards the project doc only, so products go
+            # after it: a save that loses the race stops before touching them. The exception is a
+            # project not on the subcollection layout yet, whose subcollection nobody reads until
+            # the doc points at it: it is filled first.
+            fill_first = project_data.get("products_storage") != "subcollection"
+            if fill_first and not self._write_products(project_id, products_for_storage, project_data, options_path):
                 return False
 
-            firestore_data["image_mappings"] = new_mappings
+            # 7. Project doc (guarded by the token from the last load/save)
+            project_data["_update_time"] = self._write_project_doc(project_id, firestore_data, expected_update_time)
+            project_data["products_storage"] = "subcollection"
 
-            # 6. Excel
-            excel_bytes = project_data.get("excel_file_data")
-            if excel_bytes:
-                name = project_data.get("excel_filename") or "grid.xlsx"
-                path = self._excel_blob_path(project_id, name)
-                url = self._upload_bytes(path, excel_bytes, "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
-                firestore_data["excel_blob_path"] = path
-                firestore_data["excel_url"] = url
+            if not fill_first and not self._write_products(project_id, products_for_storage, project_data, options_path):
+                return False
 
-            self.db.collection(self.collection_name).document(project_id).set(firestore_data)
+            # Migrated from the legacy single-blob layout: only now that the doc points at the
+            # subcollection is the old file dead weight
+            legacy_path = project_data.get("products_blob_path")
+            if legacy_path:
+                try:
+                    self._delete_blob_quietly(legacy_path)
+                    project_data.pop("products_blob_path", None)
+                except GoogleAPICallError as e:
+                    st.warning(f"Saved, but the old products file could not be removed: {e}")
+
+            if stale_paths:
+                try:
+                    self._delete_blobs(stale_paths)
+                except GoogleAPICallError as e:
+                    st.warning(f"Saved, but some replaced images could not be removed: {e}")
+
+            # The uploaded bytes now live in Storage; don't keep a copy per session
+            for product in project_data.get("products_data", []):
+                product.pop("image_data", None)
+            project_data.pop("excel_file_data", None)
+            clear_cloud_caches()
             return new_mappings
 
+        except (FailedPrecondition, Aborted):
+            # Someone else saved this project since it was loaded: keep their version
+            self._doc_snapshots.pop(project_id, None)
+            self._product_snapshots.pop(project_id, None)
+            st.error("⚠️ This project was changed by someone else. Use 'Reload project' to get their version, then re-apply your edits.")
+            return dict(SAVE_CONFLICT)
         except Exception as e:
             st.error(f"Error saving: {e}")
             return False
         finally:
-            self._saving_in_progress = False
-
-    def load_project(self, project_id: str) -> Optional[Dict]:
+            with self._saving_lock:
+                self._saving_projects.discard(project_id)
+
+    def load_project(self, project_id: str, *, persist_repairs: bool = True, repair: bool = True) -> Optional[Dict]:
+        """
+        Loads a full project. Auto-repaired image URLs are written back to Firestore unless
+        persist_repairs=False (read-only viewers must not write). repair=False skips the URL
+        restore / self-heal pass for projects in the subcollection layout, whose product URLs
+        save_project already wrote from the (healed) mappings; legacy projects are always repaired.
+        """
         try:
             doc = self.db.collection(self.collection_name).document(project_id).get()
             if not doc.exists: return None
             data = doc.to_dict() or {}
-
-            # 1. Load Offloaded Data
-            blob_path = data.get("products_blob_path")
-            if blob_path:
-                json_bytes = self._download_blob_bytes(blob_path)
+            self._doc_snapshots[project_id] = self._doc_fingerprints(data)
+            data["_update_time"] = doc.update_time  # optimistic-concurrency token for save_project
+
+            # 1. Load Products (subcollection; legacy projects keep a single JSON blob)
+            if data.get("products_storage") == "subcollection":
+                data["products_data"] = self._load_products(project_id)
+                options_bytes = self._download_blob_bytes(data.get("filter_options_blob_path"))
+                if options_bytes:
+                    data["filter_options"] = _loads_json_blob(options_bytes)
+                    self._options_snapshots[project_id] = _json_dumps(data["filter_options"], sort_keys=True)
+            elif data.get("products_blob_path"):
+                json_bytes = self._download_blob_bytes(data["products_blob_path"])
                 if json_bytes:
-                    loaded_json = json.loads(json_bytes.decode('utf-8'))
+                    loaded_json = _loads_json_blob(json_bytes)
+                    del json_bytes
                     if isinstance(loaded_json, dict) and "products" in loaded_json:
                         data["products_data"] = loaded_json["products"]
                         if "filter_options" in loaded_json:
@@ -225,68 +576,75 @@ class ProjectFirestoreManager:
             else:
                 if "products_data" not in data: data["products_data"] = []
 
+            if not repair and data.get("products_storage") == "subcollection":
+                data.pop("uploaded_images", None)
+                return data
+
             # 2. Restore URLs
             img_map = data.get("image_mappings", {})
-            url_lookup = {}
-            for k, v in img_map.items():
-                if isinstance(v, dict) and "public_url" in v: url_lookup[k] = v["public_url"]
-                elif isinstance(v, str): url_lookup[k] = v
+            url_lookup = {
+                k: (v["public_url"] if isinstance(v, dict) else v)
+                for k, v in img_map.items()
+                if isinstance(v, str) or (isinstance(v, dict) and "public_url" in v)
+            }
 
             # 3. SELF-HEALING & AUTO-REPAIR
-            # This loops through every product. If the URL is missing OR looks like "gs://", 
-            # it reconstructs a valid https URL on the fly.
+            # Mapping URL wins over the product's saved URL; "gs://" links (broken for
+            # browsers) are rebuilt as https on the fly.
+            gs_prefix, public_url, blob_path_of = self._gs_prefix, self._public_url, self._blob_path_from_url
+            lookup = url_lookup.get
+
+            # Single pass: normalize id, resolve URL, heal it, drop stray bytes
+            repaired = {}
             for p in data["products_data"]:
-                pid = str(p.get("product_id", "")).lower().strip()
-                
-                # Check mapping first
-                mapped_url = url_lookup.get(pid)
-                
-                # If no mapping, check the product's saved URL
-                if not mapped_url:
-                    mapped_url = p.get("image_url")
-                
-                # --- THE REPAIR LOGIC ---
+                pid = p["_pid_norm"] = _norm_pid(p.get("product_id", ""))
+                mapped_url = lookup(pid) or p.get("image_url")
                 if mapped_url:
-                    # If it's a gs:// link (broken for browsers), fix it to https
-                    if mapped_url.startswith("gs://"):
-                        # Extract the path part: gs://bucket-name/projects/... -> projects/...
-                        try:
-                            clean_path = mapped_url.replace(f"gs://{self.bucket_name}/", "")
-                            mapped_url = f"https://storage.googleapis.com/{self.bucket_name}/{urllib.parse.quote(clean_path)}"
-                        except:
-                            pass # Keep original if parse fails
-
-                    # Save the fixed URL to the product object for display
+                    if mapped_url.startswith(gs_prefix):
+                        path = blob_path_of(mapped_url)
+                        mapped_url = public_url(path)
+                        repaired[pid] = {"blob_path": path, "public_url": mapped_url}
                     p["image_url"] = mapped_url
-                    
-                    # (Optional) Update lookup so we stay consistent in this session
-                    url_lookup[pid] = mapped_url
-                
                 p.pop("image_data", None)
 
+            # 4. Persist repairs once, so later loads of this project skip the rewrite
+            if repaired:
+                img_map = {**img_map, **repaired}
+                if persist_repairs:
+                    try:
+                        result = self.db.collection(self.collection_name).document(project_id).update({"image_mappings": img_map})
+                        data["_update_time"] = result.update_time  # our own write must not look like a conflict
+                    except GoogleAPICallError:
+                        pass  # Repair is still applied in memory; retry on next load
+
             data["image_mappings"] = img_map
             data.pop("uploaded_images", None)
             return data
         except Exception as e:
             st.error(f"Error loading: {e}"); return None
 
+    @staticmethod
+    def _summary_from_doc(v: Dict) -> Dict:
+        return {
+            "id": v.get("id"),
+            "name": v.get("name", ""),
+            "description": v.get("description", ""),
+            "created_date": v.get("created_date", ""),
+            "last_modified": v.get("last_modified", ""),
+            "num_products": v.get("product_count", len(v.get("products_data", []))),
+            "num_attributes": v.get("num_attributes", len(v.get("attributes", []))),
+            "num_pending_changes": v.get("num_pending_changes", len(v.get("pending_changes", {}))),
+        }
+
     def list_projects(self) -> List[Dict]:
         try:
-            docs = self.db.collection(self.collection_name).stream()
-            items = []
-            for d in docs:
-                v = d.to_dict() or {}
-                count = v.get("product_count", len(v.get("products_data", [])))
-                items.append({
-                    "id": v.get("id"),
-                    "name": v.get("name", ""),
-                    "description": v.get("description", ""),
-                    "created_date": v.get("created_date", ""),
-                    "last_modified": v.get("last_modified", ""),
-                    "num_products": count,
-                    "num_attributes": len(v.get("attributes", [])),
-                    "num_pending_changes": len(v.get("pending_changes", {})),
-                })
+            # Projection: only the summary fields travel, never attributes/mappings/legacy products
+            col = self.db.collection(self.collection_name)
+            snaps = list(col.select(SUMMARY_FIELDS).stream())
+            # Docs saved before the counts were stored need the full read once
+            legacy = [col.document(d.id) for d in snaps if "num_attributes" not in (d.to_dict() or {})]
+            full = {d.id: d.to_dict() or {} for d in self.db.get_all(legacy)} if legacy else {}
+            items = [self._summary_from_doc(full.get(d.id) or d.to_dict() or {}) for d in snaps]
             return sorted(items, key=lambda x: x.get("last_modified", ""), reverse=True)
         except Exception as e:
             st.error(f"Error listing: {e}"); return []
@@ -295,18 +653,24 @@ class ProjectFirestoreManager:
         try:
             # 1. Delete ALL Storage Files under projects/{project_id}/
             # In Google Cloud Storage, "folders" are just prefixes. 
-            # We list every blob starting with this project's ID and delete it.
+            # We list every blob starting with this project's ID and delete them in batches.
             prefix = f"projects/{project_id}/"
-            blobs = list(self._bucket().list_blobs(prefix=prefix))
-            
-            for blob in blobs:
-                try:
-                    blob.delete()
-                except Exception:
-                    pass # Continue deleting other files even if one fails
-
-            # 2. Delete the Firestore Document
-            self.db.collection(self.collection_name).document(project_id).delete()
+            self._delete_blobs(blob.name for blob in self._bkt.list_blobs(prefix=prefix))
+
+            # 2. Delete the products subcollection and the Firestore Document in one bulk write
+            project_ref = self.db.collection(self.collection_name).document(project_id)
+            failed = set()
+            writer = self._bulk_writer(failed)
+            for ref in self._products_ref(project_id).list_documents():
+                writer.delete(ref)
+            writer.delete(project_ref)
+            writer.close()
+            if failed:
+                raise RuntimeError(f"{len(failed)} document(s) could not be deleted")
+            self._product_snapshots.pop(project_id, None)
+            self._doc_snapshots.pop(project_id, None)
+            self._options_snapshots.pop(project_id, None)
+            clear_cloud_caches()
             return True
             
         except Exception as e:
@@ -317,6 +681,17 @@ class ProjectFirestoreManager:
 # App Integration Helpers
 # =========================
 
+@st.cache_resource(show_spinner=False)
+def _build_manager(bucket_name: str, json_path: Optional[str] = None, project_id: Optional[str] = None,
+                   client_email: Optional[str] = None, _creds=None) -> ProjectFirestoreManager:
+    """
+    One manager (and one set of Firestore/Storage clients) per process, shared by all sessions.
+    _creds is not hashed; project_id/client_email identify the credentials in the cache key.
+    """
+    if json_path:
+        return ProjectFirestoreManager(firebase_config_json_path=json_path, bucket_name=bucket_name)
+    return ProjectFirestoreManager(creds=_creds, project_id=project_id, bucket_name=bucket_name)
+
 def integrate_with_streamlit_app() -> Optional[ProjectFirestoreManager]:
     if "firestore_manager" in st.session_state and st.session_state.firestore_manager:
         return st.session_state.firestore_manager
@@ -327,10 +702,7 @@ def integrate_with_streamlit_app() -> Optional[ProjectFirestoreManager]:
             if not bucket_name:
                 st.error("Missing bucket_name.")
                 st.stop()
-            mgr = ProjectFirestoreManager(
-                firebase_config_json_path="serviceAccount.json",
-                bucket_name=bucket_name,
-            )
+            mgr = _build_manager(bucket_name, json_path="serviceAccount.json")
             st.session_state.firestore_manager = mgr
             return mgr
 
@@ -343,10 +715,11 @@ def integrate_with_streamlit_app() -> Optional[ProjectFirestoreManager]:
                  st.error(f"Firebase Credentials Error: {e}")
                  st.stop()
 
-            mgr = ProjectFirestoreManager(
-                creds=creds,
+            mgr = _build_manager(
+                fb["bucket_name"],
                 project_id=fb["project_id"],
-                bucket_name=fb["bucket_name"],
+                client_email=fb.get("client_email"),
+                _creds=creds,
             )
             st.session_state.firestore_manager = mgr
             return mgr
@@ -360,41 +733,169 @@ def integrate_with_streamlit_app() -> Optional[ProjectFirestoreManager]:
         st.session_state.firestore_manager = None
         return None
 
+# Read caches. The leading underscore keeps Streamlit from hashing the manager;
+# save_project/delete_project clear both caches through clear_cloud_caches().
+
+@st.cache_data(ttl=60, show_spinner=False)
+def _cached_list_projects(_mgr: ProjectFirestoreManager, bucket_name: str) -> List[Dict]:
+    return _mgr.list_projects()
+
+@st.cache_data(ttl=300, show_spinner=False)
+def _cached_load_project(_mgr: ProjectFirestoreManager, bucket_name: str, project_id: str, last_modified: Optional[str],
+                         read_only: bool = False) -> Optional[Dict]:
+    return _mgr.load_project(project_id, persist_repairs=not read_only, repair=not read_only)
+
+def clear_cloud_caches():
+    _cached_list_projects.clear()
+    _cached_load_project.clear()
+
 def load_project_summaries_from_cloud() -> int:
     mgr: ProjectFirestoreManager = st.session_state.get("firestore_manager")
     if not mgr:
         st.session_state.project_summaries = []
         return 0
-    summaries = mgr.list_projects()
+    summaries = _cached_list_projects(mgr, mgr.bucket_name)
     st.session_state.project_summaries = summaries or []
     return len(st.session_state.project_summaries)
 
-def ensure_project_loaded(project_id: str) -> bool:
+def ensure_project_loaded(project_id: str, read_only: bool = False) -> bool:
+    """
+    Loads a project into the session once. read_only loads (client view) never write to
+    Firestore and skip the URL self-heal pass where the stored URLs can be trusted.
+    """
     if "projects" not in st.session_state: st.session_state.projects = {}
     if project_id in st.session_state.projects: return True
 
     mgr: ProjectFirestoreManager = st.session_state.get("firestore_manager")
     if not mgr: return False
     
+    # last_modified is part of the cache key, so a newer version of the project is never served stale
+    last_modified = next((s.get("last_modified") for s in st.session_state.get("project_summaries", []) if s.get("id") == project_id), None)
     with st.spinner(f"Loading project {project_id}..."):
-        data = mgr.load_project(project_id)
+        data = _cached_load_project(mgr, mgr.bucket_name, project_id, last_modified, read_only=read_only)
         if not data:
+            _cached_load_project.clear()  # don't pin the failure for the TTL
             st.error("Failed to load project from Firestore.")
             return False
         st.session_state.projects[project_id] = data
         return True
 
-def save_current_project_to_cloud() -> bool | Dict:
+# Background saves: save intents are queued and coalesced per (session, project), and a
+# single daemon thread writes the latest version once the project has been quiet for
+# SAVE_DEBOUNCE_SECONDS. The worker has no Streamlit script context, so progress is
+# reported through _save_status (see get_save_status) rather than st.* calls. Both dicts
+# are keyed by _save_key(): a save's outcome belongs to the session that asked for it.
+
+SAVE_DEBOUNCE_SECONDS = 2.0
+_save_queue: "queue.Queue[tuple]" = queue.Queue()
+_save_status: Dict[tuple, str] = {}
+_save_superseded: Dict[tuple, float] = {}  # save key -> time of a newer inline save
+_save_worker: Optional[threading.Thread] = None
+_save_worker_lock = threading.Lock()
+
+def _save_key(project_id: str) -> tuple:
+    """(session, project) key for the save bookkeeping; call from the script thread."""
+    return (get_or_create_user_id(), project_id)
+
+def _status_of(result) -> str:
+    if result == SAVE_CONFLICT: return "conflict"
+    return "failed" if result is False else "saved"
+
+def _save_worker_loop():
+    pending = {}  # save key -> (mgr, project snapshot, session's project dict, time of latest intent)
+    while True:
+        timeout = None
+        if pending:
+            oldest = min(t for *_, t in pending.values())
+            timeout = max(0.0, oldest + SAVE_DEBOUNCE_SECONDS - time.monotonic())
+        try:
+            mgr, key, project, original, queued_at = _save_queue.get(timeout=timeout)
+            pending[key] = (mgr, project, original, queued_at)  # newer intent replaces older
+        except queue.Empty:
+            pass
+
+        now = time.monotonic()
+        for key, (mgr, project, original, queued_at) in list(pending.items()):
+            if now - queued_at < SAVE_DEBOUNCE_SECONDS: continue
+            del pending[key]
+            if queued_at <= _save_superseded.get(key, float("-inf")):
+                # A newer inline save covers these edits; its own outcome is the status (on
+                # failure the "failed" retry re-queues the session's project, edits included)
+                continue
+            _save_status[key] = "saving"
+            # Token as of now, not as of queueing: an earlier save may have finished meanwhile
+            project["_update_time"] = original.get("_update_time")
+            try:
+                result = mgr.save_project(key[1], project)
+            except Exception:
+                result = False
+            if _status_of(result) == "saved":
+                # Hand what the save produced back to the session's (uncopied) project, so its
+                # next save neither conflicts nor redoes the work
+                original["_update_time"] = project.get("_update_time")
+                original["image_mappings"] = result
+                original["products_storage"] = project.get("products_storage")
+                if "products_blob_path" not in project: original.pop("products_blob_path", None)
+            _save_status[key] = _status_of(result)
+
+def queue_project_save(mgr: ProjectFirestoreManager, project_id: str, project: Dict):
+    """Schedules a debounced background save of a copy of `project`; returns immediately."""
+    global _save_worker
+    with _save_worker_lock:
+        if _save_worker is None or not _save_worker.is_alive():
+            _save_worker = threading.Thread(target=_save_worker_loop, name="project-save-worker", daemon=True)
+            _save_worker.start()
+    key = _save_key(project_id)
+    _save_status[key] = "queued"
+    # Copy now: the UI keeps mutating the session's project dict while the save waits
+    _save_queue.put((mgr, key, _copy_for_save(project), project, time.monotonic()))
+
+def _copy_for_save(project: Dict) -> Dict:
+    """
+    Copy of `project` as save_project reads it, without copy.deepcopy's cost on large projects.
+    Products are copied two levels deep (their attribute dicts hold plain values) and
+    image_mappings one level (entries are replaced, never edited); other fields are small.
+    """
+    snapshot = {k: copy.deepcopy(v) for k, v in project.items() if k not in ("products_data", "image_mappings")}
+    snapshot["image_mappings"] = dict(project.get("image_mappings", {}))
+    snapshot["products_data"] = [
+        {k: (v.copy() if isinstance(v, (dict, list)) else v) for k, v in p.items()}
+        for p in project.get("products_data", [])
+    ]
+    return snapshot
+
+def save_project_now(mgr: ProjectFirestoreManager, project_id: str, project: Dict):
+    """
+    Inline save_project that this session's queued (older) copies of the project must not
+    overwrite; its outcome is reported through get_save_status like a background save's.
+    """
+    key = _save_key(project_id)
+    _save_superseded[key] = time.monotonic()
+    result = mgr.save_project(project_id, project)
+    _save_status[key] = _status_of(result)
+    return result
+
+def reload_project(project_id: str) -> bool:
+    """Drops the session's copy of a project and loads the stored version (after a save conflict)."""
+    st.session_state.get("projects", {}).pop(project_id, None)
+    _save_status.pop(_save_key(project_id), None)
+    _cached_load_project.clear()
+    return ensure_project_loaded(project_id)
+
+def get_save_status(project_id: str) -> Optional[str]:
+    """'queued' | 'saving' | 'saved' | 'failed' | 'conflict' for this session's saves of the project, or None."""
+    return _save_status.get(_save_key(project_id))
+
+def save_current_project_to_cloud() -> bool:
     mgr: ProjectFirestoreManager = st.session_state.get("firestore_manager")
     proj_id: Optional[str] = st.session_state.get("current_project")
     if not mgr or not proj_id: return False
     project = st.session_state.projects.get(proj_id)
     if not project: return False
 
-    result = mgr.save_project(proj_id, project)
-    if result is not False:
-        st.success("☁️ Project saved to cloud!")
-    return result
+    queue_project_save(mgr, proj_id, project)
+    st.toast("☁️ Saving project to cloud...")
+    return True
 
 def get_or_create_user_id() -> str:
     if "user_id" not in st.session_state:
@@ -1,14 +1,33 @@
 import streamlit as st
 import pandas as pd
+import numpy as np
 import os
+import re
+import functools
+import hashlib
 import time # For performance troubleshooting
 from collections import defaultdict
-import base64
+from itertools import repeat
+import bisect
 from io import BytesIO
-from datetime import datetime
+from datetime import datetime, timezone
 import uuid
 from PIL import Image, ImageOps
 import plotly.express as px
+from concurrent.futures import ThreadPoolExecutor
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+
+try:
+    import python_calamine  # noqa: F401  (enables pandas' fast 'calamine' Excel engine)
+    HAS_CALAMINE = True
+except ImportError:
+    HAS_CALAMINE = False
+
+try:
+    import xlsxwriter  # streams the Excel download in constant memory
+    HAS_XLSXWRITER = True
+except ImportError:
+    HAS_XLSXWRITER = False
 
 # This assumes your firestore_manager.py file is present and correct
 from firestore_manager import (
@@ -17,6 +36,11 @@ from firestore_manager import (
     save_current_project_to_cloud,
     load_project_summaries_from_cloud,
     ensure_project_loaded,
+    queue_project_save,
+    save_project_now,
+    get_save_status,
+    reload_project,
+    SAVE_CONFLICT,
 )
 
 # Initialize Firebase
@@ -97,10 +121,9 @@ hide_streamlit_style = """
     }
 </style>
 """
-st.markdown(hide_streamlit_style, unsafe_allow_html=True)
 
 # Custom CSS
-st.markdown("""
+custom_css = """
 <style>
     .main > div {
         padding-top: 2rem;
@@ -157,86 +180,121 @@ st.markdown("""
         text-align: center;
     }
 </style>
-""", unsafe_allow_html=True)
+"""
+
+@st.cache_resource(show_spinner=False)
+def app_css():
+    """
+    Both style blocks as one minified <style> tag. Built once per process; the page still
+    emits it on every run (Streamlit drops elements a rerun doesn't re-emit), but as a
+    single, smaller element instead of two.
+    """
+    css = "".join(re.findall(r"<style>(.*?)</style>", hide_streamlit_style + custom_css, re.S))
+    css = re.sub(r"/\*.*?\*/", "", css, flags=re.S)
+    css = re.sub(r"\s*([{};:,>])\s*", r"\1", css)
+    return "<style>" + re.sub(r"\s+", " ", css).strip() + "</style>"
+
+st.markdown(app_css(), unsafe_allow_html=True)
 
 # --- IMAGE PROCESSING HELPERS ---
 CARD_IMG_CSS_WIDTH = 200
 CARD_IMG_CSS_HEIGHT = 220  # NEW: Fixed height for grid images
 MODAL_IMG_CSS_WIDTH = 500  # CHANGED: Increased width for magnified view in edit modal
 RETINA_FACTOR = 2
+IMAGE_WORKERS = min(8, os.cpu_count() or 1)  # threads for resizing uploads
+THUMB_JPEG_QUALITY = 80  # card thumbnails are small; artifacts don't show at that size
+SAVE_STATUS_POLL_SECONDS = 2  # background saves finish after the run that queued them
 
 
-@st.cache_data(show_spinner=False)
-def get_image_html_from_url(product_id: str, image_url: str, css_width: int):
-    """Creates a simple <img> tag from a URL. Caches against the product_id."""
+@functools.lru_cache(maxsize=8192)
+def _image_html(image_url: str, css_width: int) -> str:
     if not image_url:
         # UPDATED: Use fixed height for placeholder
         return f'<div style="width: {css_width}px; height: {CARD_IMG_CSS_HEIGHT}px; display: flex; align-items: center; justify-content: center; background-color: #f0f2f6; border-radius: 8px;">📷 No image</div>'
-    
     # UPDATED: Fixed height with object-fit: contain
     return f'<img src="{image_url}" style="width: auto; max-width: {css_width}px; height: {CARD_IMG_CSS_HEIGHT}px; object-fit: contain; display: block; margin-left: auto; margin-right: auto;" alt="Product Image">'
 
-@st.cache_data(show_spinner=False)
-def _encode_png_uri(im: Image.Image) -> str:
-    """Return a PNG data URI for a PIL image."""
-    b = BytesIO()
-    im.save(b, format="PNG", optimize=True)
-    return "data:image/png;base64," + base64.b64encode(b.getvalue()).decode("ascii")
-
-@st.cache_data(show_spinner=False)
-def _resize_lanczos(img: Image.Image, target_w: int) -> Image.Image:
-    """High-quality downscale while preserving aspect ratio."""
-    if img.width <= target_w:
-        return img.copy()
-    r = target_w / img.width
-    new_h = max(1, int(round(img.height * r)))
-    return img.resize((target_w, new_h), Image.Resampling.LANCZOS)
-
-@st.cache_data(show_spinner=False)
-def build_img_srcset(image_bytes: bytes, css_width: int) -> str:
-    """Return an <img> HTML string with srcset (1x/2x) as PNG data URIs."""
-    img = Image.open(BytesIO(image_bytes))
-    img = ImageOps.exif_transpose(img)
-    one_x = _resize_lanczos(img, css_width)
-    two_x = _resize_lanczos(img, css_width * RETINA_FACTOR)
-    uri_1x = _encode_png_uri(one_x)
-    uri_2x = _encode_png_uri(two_x)
-    
-    # UPDATED: Fixed height with object-fit: contain
-    return f"""
-    <img
-      src="{uri_1x}"
-      srcset="{uri_1x} 1x, {uri_2x} {RETINA_FACTOR}x"
-      style="width: auto; max-width: {css_width}px; height: {CARD_IMG_CSS_HEIGHT}px; object-fit: contain; display: block; margin-left: auto; margin-right: auto;"
-      alt="Product Image"
-    />
+def get_image_html_from_url(product_id: str, image_url: str, css_width: int):
+    """
+    Creates a simple <img> tag from a URL. Memoized in a process-wide LRU (bounded, shared by
+    all sessions): a plain lookup per card, with no argument hashing or pickled copy of the
+    HTML as with st.cache_data.
     """
+    return _image_html(image_url, css_width)
 
-@st.cache_data(show_spinner=False)
-def get_cached_product_image_html(product_id: str, image_bytes: bytes, css_width: int):
-    """Processes and caches the image HTML against the product_id."""
-    if not image_bytes:
-        # UPDATED: Use fixed height for placeholder
-        return f'<div style="width: {css_width}px; height: {CARD_IMG_CSS_HEIGHT}px; display: flex; align-items: center; justify-content: center; background-color: #f0f2f6; border-radius: 8px;">📷 No image</div>'
-    return build_img_srcset(image_bytes, css_width)
+def _bytes_digest(data):
+    """Cache-key hash for large byte payloads: blake2b is faster than Streamlit's default md5 pass."""
+    return hashlib.blake2b(data, digest_size=16).digest()
+
+BYTES_HASH_FUNCS = {bytes: _bytes_digest}
+
+@st.cache_data(show_spinner=False, max_entries=4096, hash_funcs=BYTES_HASH_FUNCS)
+def optimize_image_for_display(image_data: bytes, max_width: int = 600, quality: int = 85, max_height: int = None) -> bytes:
+    """
+    Downscale (LANCZOS) and re-encode an uploaded image as JPEG for display, fitting it
+    within max_width (and max_height, if given). Cached on the image bytes, so each distinct
+    upload is decoded once per app lifetime. JPEG/PNG files already within bounds, and bytes
+    PIL cannot decode, are returned unchanged.
+    """
+    try:
+        img = Image.open(BytesIO(image_data))
+        fits = img.width <= max_width and (max_height is None or img.height <= max_height)
+        if fits and img.format in ("JPEG", "PNG"):
+            return image_data  # header-only check: nothing to resize, skip the decode/encode
+        img = ImageOps.exif_transpose(img)
+        if img.mode in ("RGBA", "LA", "P"):
+            img = img.convert("RGBA")
+            flat = Image.new("RGB", img.size, (255, 255, 255))
+            flat.paste(img, mask=img.getchannel("A"))
+            img = flat
+        elif img.mode != "RGB":
+            img = img.convert("RGB")
+        scale = max_width / img.width
+        if max_height is not None:
+            scale = min(scale, max_height / img.height)
+        if scale < 1:
+            img = img.resize((max(1, round(img.width * scale)), max(1, round(img.height * scale))), Image.Resampling.LANCZOS)
+        out = BytesIO()
+        img.save(out, format="JPEG", quality=quality, optimize=True)
+        return out.getvalue()
+    except (OSError, ValueError):
+        return image_data
+
+def _display_variants(image_data, max_width=600):
+    """(display_bytes or None if unchanged, card_thumbnail or None if the image is already card-sized)."""
+    optimized = optimize_image_for_display(image_data, max_width)
+    # Cards show images at a fixed height, so tall images are bounded by that too
+    thumb = optimize_image_for_display(image_data, CARD_IMG_CSS_WIDTH * RETINA_FACTOR, THUMB_JPEG_QUALITY,
+                                       max_height=CARD_IMG_CSS_HEIGHT * RETINA_FACTOR)
+    return (None if optimized == image_data else optimized), (None if thumb == image_data else thumb)
+
+def _with_variants(filename, image_data, variants):
+    """
+    (name, bytes, card_thumbnail) ready to attach as product['image_data']; the name is
+    switched to .jpg when re-encoded. Cards load the thumbnail, sized for the card widget.
+    """
+    optimized, thumb = variants
+    if optimized is None:
+        return filename, image_data, thumb
+    return os.path.splitext(filename)[0] + ".jpg", optimized, thumb
 
 
 # --- CORE DATA FUNCTIONS ---
 def create_new_project(name, description=""):
     """Create a new project with an empty data structure."""
     project_id = str(uuid.uuid4())
+    now_iso = datetime.now(timezone.utc).isoformat()
     project = {
         'id': project_id,
         'name': name,
         'description': description,
-        'created_date': datetime.now().isoformat(),
-        'last_modified': datetime.now().isoformat(),
+        'created_date': now_iso,
+        'last_modified': now_iso,
         'products_data': [],
         'attributes': [],
         'distributions': [],
         'filter_options': {},
         'pending_changes': {},
-        'uploaded_images': {},
         'excel_filename': None
     }
     st.session_state.projects[project_id] = project
@@ -245,38 +303,173 @@ def create_new_project(name, description=""):
 def update_project_timestamp(project_id):
     """Update the last modified timestamp for a project."""
     if project_id in st.session_state.projects:
-        st.session_state.projects[project_id]['last_modified'] = datetime.now().isoformat()
+        st.session_state.projects[project_id]['last_modified'] = datetime.now(timezone.utc).isoformat()
+        bump_project_version(st.session_state.projects[project_id])
+
+def project_version(project):
+    """
+    Opaque token for the current state of a project's products; cache keys include it.
+    Random rather than a counter: st.cache_data is shared by all sessions, and two sessions
+    editing the same project would otherwise reach "version 1" with different data.
+    """
+    if '_version' not in project:
+        project['_version'] = uuid.uuid4().hex
+    return project['_version']
+
+def bump_project_version(project):
+    """Call after mutating products/pending changes so cached filter results are dropped."""
+    project['_version'] = uuid.uuid4().hex
 
+_ATTR_KEY_TABLE = str.maketrans({' ': '_', '/': '_', '(': None, ')': None, '+': 'plus', ':': None})
+
+@functools.lru_cache(maxsize=512)
 def sanitize_attr(attr):
     """Sanitize attribute names for use as keys."""
-    return attr.replace(' ', '_').replace('/', '_').replace('(', '').replace(')', '').replace('+', 'plus').replace(':', '')
-
-def get_filter_options(products, attributes):
-    """Generate filter options from products data."""
-    opts = defaultdict(set)
-    for p in products:
-        for attr in attributes:
-            opts[attr].add(p["attributes"][attr])
-    return {k: sorted(v) for k, v in opts.items()}
-
-def find_image_for_product(product_id, uploaded_images):
-    """Find matching image for a product ID."""
-    for filename, file_data in uploaded_images.items():
-        name_part = os.path.splitext(filename)[0].lower()
-        if name_part == str(product_id).lower():
-            return file_data
-    return None
-
-def create_image_lookup(uploaded_images: dict) -> dict:
+    return attr.translate(_ATTR_KEY_TABLE)
+
+@functools.lru_cache(maxsize=512)
+def attr_label(field):
+    """Display name of an attribute column ('ATT Color' -> 'Color'); other fields pass through."""
+    return field.replace('ATT ', '')
+
+@functools.lru_cache(maxsize=512)
+def dist_label(dist):
+    """Display name of a distribution column ('DIST Online' -> 'Online')."""
+    return dist.replace('DIST ', '')
+
+def filter_options_from_columns(attr_columns):
     """
-    Creates a dictionary for instant image lookups.
-    Key: product_id (lowercase string), Value: image_bytes.
-    This is much faster than looping.
+    Filter options ({attr: sorted distinct values}) from column-oriented data ({attr: values}).
+    Computed once per parse; edits keep project['filter_options'] up to date from then on.
     """
-    return {
-        os.path.splitext(filename)[0].lower(): file_data
-        for filename, file_data in uploaded_images.items()
-    }
+    return {attr: sorted(set(values)) for attr, values in attr_columns.items() if values}
+
+def image_stem(filename):
+    """Product ID an image file name refers to: name without extension, lowercased."""
+    return os.path.splitext(filename)[0].lower().strip()
+
+def attach_uploaded_images(products, image_files):
+    """
+    Attach uploaded image files to the products whose ID matches the file name
+    (one dict build, then one lookup per file). Returns the matched products.
+    """
+    by_id = {p['product_id'].lower().strip(): p for p in products}
+    matched, files = [], []
+    for image_file in image_files:
+        product = by_id.get(image_stem(image_file.name))
+        if product is not None:
+            matched.append(product)
+            files.append(image_file)
+    if not files:
+        return matched
+
+    # Variants of one image (same bytes under several product IDs) are resized once
+    datas = [f.getvalue() for f in files]
+    digests = [_bytes_digest(d) for d in datas]
+    unique = {}
+    for digest, data in zip(digests, datas):
+        unique.setdefault(digest, data)
+
+    # PIL releases the GIL while decoding/encoding, so the resizes overlap across threads.
+    # Workers carry this run's context so the cached calls behave as on the script thread.
+    ctx = get_script_run_ctx()
+    with ThreadPoolExecutor(max_workers=IMAGE_WORKERS, initializer=add_script_run_ctx, initargs=(None, ctx)) as pool:
+        variants = dict(zip(unique, pool.map(_display_variants, unique.values())))
+    for product, image_file, data, digest in zip(matched, files, datas, digests):
+        product['image_data'] = _with_variants(image_file.name, data, variants[digest])
+    return matched
+
+def _is_grid_column(name):
+    """Columns the app actually reads: ID, description, price, ATT* and DIST*."""
+    n = str(name).strip()
+    low = n.lower()
+    return 'product id' in low or 'description' in low or 'price' in low or n.startswith(("ATT", "DIST"))
+
+def read_excel_fast(source, **kwargs):
+    """
+    pd.read_excel with the Rust calamine reader when python-calamine is installed
+    (openpyxl otherwise). Pass usecols to skip parsing columns the app never reads.
+    """
+    return pd.read_excel(source, engine='calamine' if HAS_CALAMINE else None, **kwargs)
+
+@st.cache_data(show_spinner=False, max_entries=32, hash_funcs=BYTES_HASH_FUNCS)
+def _parse_excel_bytes(xlsx_bytes):
+    """
+    Parse grid bytes into (products, attributes, distributions, filter_options), with
+    image URLs left empty. Cached on the file content, so re-parsing the same grid
+    (in any session) is a cache hit. Returns None when the key columns are missing.
+    """
+    df = read_excel_fast(BytesIO(xlsx_bytes), usecols=_is_grid_column)
+    df.columns = [str(c).strip() for c in df.columns]
+
+    id_col = next((c for c in df.columns if 'product id' in c.lower()), None)
+    desc_col = next((c for c in df.columns if 'description' in c.lower()), None)
+    price_col = next((c for c in df.columns if 'price' in c.lower()), None)
+
+    if not id_col or not desc_col:
+        return None
+    
+    attributes = [h for h in df.columns if h.startswith("ATT")]
+    distributions = [h for h in df.columns if h.startswith("DIST")]
+    
+    # Pull each needed column out once as a plain list: no per-row Series boxing (iterrows)
+    def _clean_id(raw_id):
+        # If Excel gave us a float like 123.0, convert to integer 123 first
+        if isinstance(raw_id, float) and raw_id.is_integer():
+            product_id = str(int(raw_id)).strip()
+        else:
+            product_id = str(raw_id).strip()
+        # Double check for string ".0" suffix just in case
+        return product_id[:-2] if product_id.endswith(".0") else product_id
+
+    def _clean_price(raw):
+        # Blank cells: None/NaT/pd.NA fail float(), NaN fails the self-comparison (no pd.isna call per row)
+        try:
+            price_val = float(raw)
+        except (ValueError, TypeError):
+            return "0.00"
+        return f"{price_val:.2f}" if price_val == price_val else "0.00"
+
+    n_rows = len(df)
+    ids = [_clean_id(v) for v in df[id_col].tolist()]
+    descriptions = [str(v).strip() for v in df[desc_col].tolist()]
+    prices = [_clean_price(v) for v in df[price_col].tolist()] if price_col else ["0.00"] * n_rows
+    attr_cols = {a: [str(v).strip() for v in df[a].tolist()] for a in attributes}
+    dist_cols = {d: ["X" in str(v).upper() for v in df[d].tolist()] for d in distributions}
+
+    # Row-wise view of the attribute/distribution columns (zip(*[]) would yield no rows at all)
+    attr_rows = zip(*attr_cols.values()) if attributes else repeat((), n_rows)
+    dist_rows = zip(*dist_cols.values()) if distributions else repeat((), n_rows)
+
+    products = []
+    for idx, product_id, description, price_str, attr_vals, dist_vals in zip(
+        df.index.tolist(), ids, descriptions, prices, attr_rows, dist_rows
+    ):
+        attr_data = dict(zip(attributes, attr_vals))
+        dist_data = dict(zip(distributions, dist_vals))
+        
+        products.append({
+            "original_index": idx, "product_id": product_id, 
+            "image_data": None, # We no longer use raw bytes here
+            "image_url": None, # Filled in by load_and_parse_excel from the image mappings
+            "thumb_url": None,
+            "description": description, "original_description": description,
+            "price": price_str, "original_price": price_str,
+            "attributes": attr_data, "original_attributes": attr_data,  # shared until first edit: writable_attributes()
+            "distribution": dist_data
+        })
+    
+    filter_options = filter_options_from_columns(attr_cols)
+    return products, attributes, distributions, filter_options
+
+@st.cache_data(show_spinner=False, max_entries=32, hash_funcs=BYTES_HASH_FUNCS)
+def _excel_product_ids(xlsx_bytes):
+    """
+    Lowercased product IDs of a grid (None when the key columns are missing), for the upload
+    preview: a small cached set, instead of a fresh copy of every parsed product on each call.
+    """
+    parsed = _parse_excel_bytes(xlsx_bytes)
+    return None if parsed is None else frozenset(p['product_id'].lower() for p in parsed[0])
 
 def load_and_parse_excel(uploaded_file, image_url_mappings):
     """
@@ -289,68 +482,28 @@ def load_and_parse_excel(uploaded_file, image_url_mappings):
     # --- OPTIMIZATION: Create the URL lookup dictionary ONCE ---
     # The keys are product IDs, and the values are the image URLs.
     url_lookup = {}
+    thumb_lookup = {}
     for product_id, meta in image_url_mappings.items():
         if isinstance(meta, dict) and meta.get("public_url"):
             url_lookup[product_id.lower()] = meta["public_url"]
+            if meta.get("thumb_url"):
+                thumb_lookup[product_id.lower()] = meta["thumb_url"]
         elif isinstance(meta, str): # Legacy support
             url_lookup[product_id.lower()] = meta
     
     try:
-        df = pd.read_excel(uploaded_file)
-        df.columns = [str(c).strip() for c in df.columns]
-
-        id_col = next((c for c in df.columns if 'product id' in c.lower()), None)
-        desc_col = next((c for c in df.columns if 'description' in c.lower()), None)
-        price_col = next((c for c in df.columns if 'price' in c.lower()), None)
-
-        if not id_col or not desc_col:
+        parsed = _parse_excel_bytes(uploaded_file.getvalue())
+        if parsed is None:
             st.error("❌ Critical Error: Could not find 'Product ID' and 'Description' columns in the Excel file.")
             st.stop()
-        
-        attributes = [h for h in df.columns if h.startswith("ATT")]
-        distributions = [h for h in df.columns if h.startswith("DIST")]
-        
-        products = []
-        for idx, row in df.iterrows():
-            
-            # --- ROBUST ID HANDLING ---
-            raw_id = row[id_col]
-            # If Excel gave us a float like 123.0, convert to integer 123 first
-            if isinstance(raw_id, float) and raw_id.is_integer():
-                product_id = str(int(raw_id)).strip()
-            else:
-                product_id = str(raw_id).strip()
-            
-            # Double check for string ".0" suffix just in case
-            if product_id.endswith(".0"):
-                product_id = product_id[:-2]
-            # --------------------------
+        products, attributes, distributions, filter_options = parsed
+
+        # --- OPTIMIZATION: Use the fast dictionary lookup to get the URL ---
+        for product in products:
+            key = product["product_id"].lower()
+            product["image_url"] = url_lookup.get(key)
+            product["thumb_url"] = thumb_lookup.get(key)
 
-            description = str(row[desc_col]).strip()
-            
-            try:
-                price_val = float(row[price_col]) if price_col and not pd.isna(row[price_col]) else 0.0
-                price_str = f"{price_val:.2f}"
-            except (ValueError, TypeError):
-                price_str = "0.00"
-            
-            # --- OPTIMIZATION: Use the fast dictionary lookup to get the URL ---
-            image_url = url_lookup.get(product_id.lower())
-            
-            attr_data = {a: str(row[a]).strip() for a in attributes}
-            dist_data = {d: "X" in str(row[d]).upper() for d in distributions}
-            
-            products.append({
-                "original_index": idx, "product_id": product_id, 
-                "image_data": None, # We no longer use raw bytes here
-                "image_url": image_url, # We now use the URL
-                "description": description, "original_description": description,
-                "price": price_str, "original_price": price_str,
-                "attributes": attr_data, "original_attributes": attr_data.copy(),
-                "distribution": dist_data
-            })
-        
-        filter_options = get_filter_options(products, attributes)
         return products, attributes, distributions, filter_options
 
     except Exception as e:
@@ -358,41 +511,280 @@ def load_and_parse_excel(uploaded_file, image_url_mappings):
         return [], [], [], {}
         
         
-def apply_filters(products, attribute_filters, distribution_filters, pending_changes=None, show_pending_only=False):
-    """Apply filters to products and return filtered list."""
+def dist_display_map(distributions):
+    """Display name (as shown in the Distribution filter) -> original DIST column(s)."""
+    out = defaultdict(list)
+    for d in distributions:
+        out[dist_label(d)].append(d)
+    return dict(out)
+
+def build_products_frame(products, attributes=None, distributions=None):
+    """
+    Column-oriented view of products for vectorized filtering:
+    'attrs' (one categorical column per attribute, so isin() compares integer codes),
+    'postings' ({attr: {value: sorted positions}}, an inverted index over 'attrs'),
+    'dists' (distribution flags bit-packed: bit j of row i = product i carries distribution j,
+    64 per uint64 word), 'keys' (original_index as str, matching pending_changes keys -> position)
+    and 'dist_map' (sidebar display name -> bit mask of its distribution columns).
+    """
+    if attributes is None:
+        attributes = list(products[0]["attributes"]) if products else []
+    if distributions is None:
+        distributions = list(products[0]["distribution"]) if products else []
+    attrs = pd.DataFrame({attr: pd.Categorical([p["attributes"].get(attr, "") for p in products]) for attr in attributes}, index=range(len(products)))
+    n_words = max(1, (len(distributions) + 63) // 64)
+    dists = np.zeros((len(products), n_words), dtype=np.uint64)
+    dist_bits = {}
+    for j, dist in enumerate(distributions):
+        word, bit = divmod(j, 64)
+        flags = np.fromiter((bool(p["distribution"].get(dist, False)) for p in products), dtype=bool, count=len(products))
+        dists[flags, word] |= np.uint64(1) << np.uint64(bit)
+        dist_bits[dist] = (word, bit)
+    dist_map = {}
+    for name, cols in dist_display_map(distributions).items():
+        mask = np.zeros(n_words, dtype=np.uint64)
+        for col in cols:
+            word, bit = dist_bits[col]
+            mask[word] |= np.uint64(1) << np.uint64(bit)
+        dist_map[name] = mask
+    return {
+        'attrs': attrs,
+        'postings': {attr: _postings(attrs[attr]) for attr in attrs.columns},
+        'dists': dists,
+        'keys': {str(p["original_index"]): i for i, p in enumerate(products)},
+        'dist_map': dist_map,
+    }
+
+def _postings(column):
+    """{category: ascending positions holding it} for a categorical column (one stable argsort)."""
+    codes = column.cat.codes.to_numpy()
+    order = np.argsort(codes, kind='stable')
+    bounds = np.searchsorted(codes[order], np.arange(len(column.cat.categories) + 1))
+    return {cat: order[bounds[i]:bounds[i + 1]] for i, cat in enumerate(column.cat.categories)}
+
+@st.cache_resource(show_spinner=False, max_entries=16)
+def _cached_products_frame(project_id, version, _products, _attributes, _distributions):
+    """One frame per (project, data version), shared without copying. Treat as read-only."""
+    return build_products_frame(_products, _attributes, _distributions)
+
+@st.cache_resource(show_spinner=False, max_entries=16)
+def _cached_filter_choices(project_id, version, _filter_options, _attributes, _distributions):
+    """Sidebar filter choices per (project, data version), shared without copying. Treat as read-only."""
+    attr_choices = {attr: ('All', *_filter_options.get(attr, [])) for attr in _attributes}
+    dist_choices = ('All', *(dist_label(d) for d in _distributions))
+    return attr_choices, dist_choices
+
+def filter_choices(project):
+    """({attr: ('All', *options)}, ('All', *distribution labels)) for the filter multiselects."""
+    return _cached_filter_choices(project['id'], project_version(project), project['filter_options'],
+                                  project['attributes'], project['distributions'])
+
+@st.cache_resource(show_spinner=False, max_entries=16)
+def _cached_view_fields(project_id, version, _attributes):
+    all_fields = ('Description', 'Price', *_attributes)
+    return all_fields, ('product_id', *all_fields)
+
+def view_fields(project):
+    """(fields for Show Attributes, sort options) as shared tuples, rebuilt only when the project's version changes."""
+    return _cached_view_fields(project['id'], project_version(project), project['attributes'])
+
+def _allowed_codes(column, selected_values):
+    """Boolean table over column's category codes: True where the category is selected."""
+    categories = column.cat.categories
+    allowed = np.zeros(len(categories) + 1, dtype=bool)  # extra slot: code -1 (missing) stays False
+    pos = categories.get_indexer(list(selected_values))
+    allowed[pos[pos >= 0]] = True
+    return allowed
+
+def _active_attribute_filters(attribute_filters):
+    """(attr, selected) pairs that actually restrict: something selected and not 'All'."""
+    return [(attr, sel) for attr, sel in attribute_filters.items() if sel and 'All' not in sel]
+
+def _distribution_filter_active(distribution_filters):
+    return bool(distribution_filters) and 'All' not in distribution_filters
+
+def _has_active_filters(attribute_filters, distribution_filters, pending_changes=None, show_pending_only=False):
+    return bool(
+        (show_pending_only and pending_changes)
+        or _active_attribute_filters(attribute_filters)
+        or _distribution_filter_active(distribution_filters)
+    )
+
+def _filter_indices(products, attribute_filters, distribution_filters, pending_changes=None, show_pending_only=False, frame=None):
+    """Positions (into products) of the products that pass all filters, in original order."""
     if not products:
         return []
-
-    filtered_products = products
+    if not _has_active_filters(attribute_filters, distribution_filters, pending_changes, show_pending_only):
+        return list(range(len(products)))  # everything on 'All' (the usual case): no scan
+    if frame is None:
+        frame = build_products_frame(products)
+
+    attrs = frame['attrs']
+    active = []
+    for attr, selected_values in _active_attribute_filters(attribute_filters):
+        if attr in attrs.columns:
+            active.append((attr, set(selected_values)))
+        elif "" not in selected_values:
+            return []
+
+    if active:
+        # Start from the most selective attribute's postings; every later check only
+        # looks at the surviving candidates, so the work follows the answer size.
+        postings = frame['postings']
+        first_attr, first_sel = min(active, key=lambda a: sum(len(postings[a[0]].get(v, ())) for v in a[1]))
+        parts = [postings[first_attr][v] for v in first_sel if v in postings[first_attr]]
+        candidates = np.sort(np.concatenate(parts)) if parts else np.empty(0, dtype=np.intp)
+        for attr, selected_values in active:
+            if attr != first_attr and len(candidates):
+                codes = attrs[attr].cat.codes.to_numpy()
+                candidates = candidates[_allowed_codes(attrs[attr], selected_values)[codes[candidates]]]
+    else:
+        candidates = np.arange(len(products))
 
     # --- NEW: Filter by Pending Changes ---
     if show_pending_only and pending_changes:
-        # Normalize keys to strings to ensure we catch both int/str formats
-        pending_keys = set(str(k) for k in pending_changes.keys())
-        filtered_products = [
-            p for p in filtered_products 
-            if str(p["original_index"]) in pending_keys
-        ]
+        # Normalize keys to strings to ensure we catch both int/str formats; then one mask gather
+        keys = frame['keys']
+        pending = np.zeros(len(products), dtype=bool)
+        pending[[keys[k] for k in map(str, pending_changes) if k in keys]] = True
+        candidates = candidates[pending[candidates]]
     # --------------------------------------
-    
-    for attr, selected_values in attribute_filters.items():
-        if selected_values and 'All' not in selected_values:
-            filtered_products = [
-                p for p in filtered_products if p["attributes"].get(attr, "") in selected_values
-            ]
-
-    if distribution_filters and 'All' not in distribution_filters:
-        filtered_products = [
-            p for p in filtered_products if any(
-                p["distribution"].get(orig_dist, False)
-                for dist in distribution_filters
-                for orig_dist in p["distribution"] if orig_dist.replace('DIST ', '') == dist
-            )
-        ]
+
+    if _distribution_filter_active(distribution_filters):
+        dist_map = frame['dist_map']
+        masks = [dist_map[d] for d in distribution_filters if d in dist_map]
+        if not masks:
+            return []
+        selected = np.bitwise_or.reduce(masks)
+        candidates = candidates[(frame['dists'][candidates] & selected).any(axis=1)]
         
-    return filtered_products
+    return candidates.tolist()
+
+def apply_filters(products, attribute_filters, distribution_filters, pending_changes=None, show_pending_only=False):
+    """Apply filters to products and return filtered list."""
+    return [products[i] for i in _filter_indices(products, attribute_filters, distribution_filters, pending_changes, show_pending_only)]
+
+@st.cache_data(show_spinner=False, max_entries=256)
+def _cached_filter_indices(project_id, version, attr_filter_items, dist_filters, show_pending_only, _products, _pending_changes, _attributes, _distributions):
+    """Filter result per (project, data version, filter state). Products are addressed by the key, not hashed."""
+    frame = None
+    if _has_active_filters(dict(attr_filter_items), dist_filters, _pending_changes, show_pending_only):
+        frame = _cached_products_frame(project_id, version, _products, _attributes, _distributions)
+    return _filter_indices(_products, dict(attr_filter_items), list(dist_filters), _pending_changes, show_pending_only, frame)
+
+def get_filtered_indices(project, attribute_filters, distribution_filters, show_pending_only=False, sort_by=None, ascending=True):
+    """
+    Cached positions (into project['products_data']) of the products passing the filters:
+    reruns with unchanged filters and data skip the scan. With sort_by they come back sorted.
+    """
+    attr_items = tuple((attr, tuple(sel)) for attr, sel in attribute_filters.items())
+    filter_args = (
+        project['id'], project_version(project), attr_items, tuple(distribution_filters),
+        show_pending_only, project['products_data'], project.get('pending_changes', {}),
+        project.get('attributes', []), project.get('distributions', [])
+    )
+    if sort_by:
+        return _cached_sorted_filter_indices(*filter_args, sort_by=sort_by, ascending=ascending)
+    return _cached_filter_indices(*filter_args)
+
+@st.cache_data(show_spinner=False, max_entries=64)
+def _cached_summary_stats(project_id, version, attr_filter_items, dist_filters, _products, _pending_changes, _attributes, _distributions):
+    """
+    Summary-page aggregates of the filtered products: their count, {attr: {value: count}}
+    (most frequent first) and the numeric prices. Recomputed only when data or filters change.
+    """
+    indices = _cached_filter_indices(project_id, version, attr_filter_items, dist_filters, False,
+                                     _products, _pending_changes, _attributes, _distributions)
+    frame = _cached_products_frame(project_id, version, _products, _attributes, _distributions)
+    unfiltered = len(indices) == len(_products)
+    counts = {}
+    for attr, column in frame['attrs'].items():
+        categories = column.cat.categories
+        if unfiltered:
+            # Every product counts: the inverted index already holds the tallies
+            tallies = np.fromiter((len(frame['postings'][attr][c]) for c in categories), dtype=np.intp, count=len(categories))
+        else:
+            codes = column.cat.codes.to_numpy()[indices]
+            tallies = np.bincount(codes[codes >= 0], minlength=len(categories))
+        order = np.argsort(-tallies, kind='stable')
+        counts[attr] = {categories[i]: int(tallies[i]) for i in order if tallies[i] > 0}
+    prices = pd.to_numeric(pd.Series([_products[i].get('price') for i in indices], dtype=object), errors='coerce')
+    return {'n': len(indices), 'counts': counts, 'prices': prices.dropna().to_numpy()}
+
+def get_summary_stats(project, attribute_filters, distribution_filters):
+    """Cached _cached_summary_stats for a project (same cache key scheme as get_filtered_indices)."""
+    return _cached_summary_stats(
+        project['id'], project_version(project),
+        tuple((attr, tuple(sel)) for attr, sel in attribute_filters.items()), tuple(distribution_filters),
+        project['products_data'], project.get('pending_changes', {}),
+        project.get('attributes', []), project.get('distributions', [])
+    )
+
+def get_filtered_products(project, attribute_filters, distribution_filters, show_pending_only=False, sort_by=None, ascending=True):
+    """Cached apply_filters for a project (see get_filtered_indices)."""
+    products = project['products_data']
+    return [products[i] for i in get_filtered_indices(project, attribute_filters, distribution_filters, show_pending_only, sort_by, ascending)]
+
+def _price_sort_value(price):
+    try:
+        return float(price or 0)
+    except (TypeError, ValueError):
+        return 0.0
+
+def product_sort_keys(products, sort_by):
+    """Sort key per product, computed once (lowercased strings, numeric IDs/prices)."""
+    if sort_by == 'product_id':
+        # Numeric IDs sort numerically and ahead of alphanumeric ones
+        return [(0, int(pid), '') if pid.isdigit() else (1, 0, pid) for pid in (p['product_id'] for p in products)]
+    if sort_by == 'Description':
+        return [p['description'].lower() for p in products]
+    if sort_by == 'Price':
+        return [_price_sort_value(p.get('price', 0)) for p in products]
+    return [p['attributes'].get(sort_by, '').lower() for p in products]
+
+@st.cache_data(show_spinner=False, max_entries=64)
+def _cached_sort_order(project_id, version, sort_by, ascending, _products):
+    """Positions of all products in sorted order, per (project, data version, sort field, direction)."""
+    keys = product_sort_keys(_products, sort_by)
+    if sort_by == 'product_id':
+        # (kind, number, text) tuples -> one integer rank: numeric IDs ranked by value first,
+        # then alphanumeric IDs by text (factorize keeps Python ints exact, however long)
+        kinds = np.fromiter((k[0] for k in keys), dtype=np.int8, count=len(keys))
+        numeric = kinds == 0
+        ranks = np.empty(len(keys), dtype=np.intp)
+        num_ranks, num_values = pd.factorize(pd.Series([k[1] for k in keys if k[0] == 0], dtype=object), sort=True)
+        ranks[numeric] = num_ranks
+        ranks[~numeric] = len(num_values) + pd.factorize(pd.Series([k[2] for k in keys if k[0] == 1], dtype=object), sort=True)[0]
+    elif sort_by == 'Price':
+        ranks = np.asarray(keys, dtype=float)
+    else:
+        # Strings -> dense ranks of their sorted distinct values, then an integer sort
+        ranks = pd.factorize(pd.Series(keys, dtype=object), sort=True)[0]
+    # Stable both ways, matching sorted(..., reverse=True): ties keep their original order
+    return np.argsort(ranks if ascending else -ranks, kind='stable')
+
+@st.cache_data(show_spinner=False, max_entries=256)
+def _cached_sorted_filter_indices(project_id, version, attr_filter_items, dist_filters, show_pending_only, _products, _pending_changes, _attributes, _distributions, sort_by, ascending):
+    """
+    Filter first, then order only the survivors by gathering through the cached full
+    permutation (a stable sort of a subset keeps the order it has in the sorted whole).
+    """
+    indices = _cached_filter_indices(project_id, version, attr_filter_items, dist_filters, show_pending_only,
+                                     _products, _pending_changes, _attributes, _distributions)
+    order = _cached_sort_order(project_id, version, sort_by, ascending, _products)
+    if len(indices) == len(order):
+        return order.tolist()
+    keep = np.zeros(len(order), dtype=bool)
+    keep[indices] = True
+    return order[keep[order]].tolist()
 
     
+def _download_price(price):
+    try:
+        return float(price) if price else 0.0
+    except (ValueError, TypeError):
+        return 0.0
+
 def create_download_excel(project):
     """Create Excel file, highlighting ONLY the most recently applied changes."""
     if not project['products_data']:
@@ -401,112 +793,179 @@ def create_download_excel(project):
     attributes = project['attributes']
     distributions = project['distributions']
     headers = ["Product ID", "Description"] + attributes + distributions + ["Price"]
+    # 0-based column of each field that can appear in a change record
+    change_cols = {'description': 1, 'price': len(headers) - 1}
+    change_cols.update((attr, 2 + j) for j, attr in enumerate(attributes))
+
+    # Retrieve the history of the last batch of applied changes
+    last_applied = project.get('last_applied_changes', {})
+
+    # Column-wise: one comprehension per column instead of assembling each row cell by cell
+    products = project['products_data']
+    columns = [[p["product_id"] for p in products], [p["description"] for p in products]]
+    columns += [[p["attributes"].get(attr, "") for p in products] for attr in attributes]
+    columns += [["X" if p["distribution"].get(dist, False) else "" for p in products] for dist in distributions]
+    columns.append([_download_price(p["price"]) for p in products])
+
+    highlights = {}  # row -> columns changed in the last applied batch
+    if last_applied:
+        # Keys normalized once (int vs string keys), then walk only the changed products' rows
+        last_applied = {str(k): v for k, v in last_applied.items() if v}
+        rows = {pending_key(p): i for i, p in enumerate(products)}
+        for key, changes in last_applied.items():
+            if key in rows:
+                highlights[rows[key]] = [change_cols[f] for f in changes if f in change_cols]
     
-    data = []
-    for product in project['products_data']:
-        row = [product["product_id"], product["description"]]
-        row.extend(product["attributes"].get(attr, "") for attr in attributes)
-        row.extend("X" if product["distribution"].get(dist, False) else "" for dist in distributions)
-        try:
-            p_val = float(product["price"]) if product["price"] else 0.0
-        except:
-            p_val = 0.0
-        row.append(p_val)
-        data.append(row)
-    
-    df = pd.DataFrame(data, columns=headers)
-    
-    from openpyxl.styles import PatternFill
     output = BytesIO()
-    
-    with pd.ExcelWriter(output, engine='openpyxl') as writer:
-        df.to_excel(writer, index=False, sheet_name='Products')
-        workbook = writer.book
-        ws = writer.sheets['Products']
-        yellow_fill = PatternFill(start_color="FFFF00", end_color="FFFF00", fill_type="solid")
-        
-        # Retrieve the history of the last batch of applied changes
-        last_applied = project.get('last_applied_changes', {})
-        
-        for i, product in enumerate(project['products_data']):
-            excel_row = i + 2
-            
-            # Get changes for this specific product ID (handle int vs string keys)
-            idx = product['original_index']
-            changes = last_applied.get(idx) or last_applied.get(str(idx)) or {}
-            
-            # If this product wasn't in the last batch, skip it
-            if not changes:
-                continue
-
-            # --- Check Description (Column 2) ---
-            if 'description' in changes:
-                ws.cell(row=excel_row, column=2).fill = yellow_fill
-            
-            # --- Check Attributes (Columns 3 to 3+len(attrs)) ---
-            for j, attr in enumerate(attributes):
-                if attr in changes:
-                    col_idx = 3 + j
-                    ws.cell(row=excel_row, column=col_idx).fill = yellow_fill
-            
-            # --- Check Price (Last Column) ---
-            if 'price' in changes:
-                price_col = len(headers)
-                ws.cell(row=excel_row, column=price_col).fill = yellow_fill
+    if HAS_XLSXWRITER:
+        _write_download_xlsxwriter(output, headers, zip(*columns), highlights)
+        return output.getvalue()
 
+    _write_download_openpyxl(output, headers, zip(*columns), highlights)
     return output.getvalue()
 
+@st.cache_data(show_spinner=False, max_entries=32)
+def _cached_download_excel(project_id, version, _project):
+    """create_download_excel per (project, data version): plain reruns reuse the workbook bytes."""
+    return create_download_excel(_project)
+
+def get_download_excel(project):
+    """Download workbook for the grid page; rebuilt only after edits/apply/reset/renames bump the version."""
+    return _cached_download_excel(project['id'], project_version(project), project)
+
+def _write_download_xlsxwriter(output, headers, rows, highlights):
+    """
+    Stream the download sheet with xlsxwriter in constant_memory mode: each row is
+    flushed as soon as it is written, highlighted cells ({row: [cols]}) get their fill at write time.
+    """
+    workbook = xlsxwriter.Workbook(output, {'constant_memory': True})
+    ws = workbook.add_worksheet('Products')
+    header_fmt = workbook.add_format({'bold': True, 'border': 1, 'align': 'center', 'valign': 'top'})
+    yellow = workbook.add_format({'bg_color': '#FFFF00'})
+
+    ws.write_row(0, 0, headers, header_fmt)
+    for i, row in enumerate(rows):
+        ws.write_row(i + 1, 0, row)
+        for col in highlights.get(i, ()):
+            ws.write(i + 1, col, row[col], yellow)
+    workbook.close()
+
+def _write_download_openpyxl(output, headers, rows, highlights):
+    """
+    Fallback when xlsxwriter is missing: openpyxl in write_only mode, which also streams rows
+    instead of building the worksheet's cell tree. Same layout and fills as the xlsxwriter path.
+    """
+    from openpyxl import Workbook
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.styles import Alignment, Border, Font, PatternFill, Side
+
+    workbook = Workbook(write_only=True)
+    ws = workbook.create_sheet('Products')
+    thin = Side(style='thin')
+    header_style = dict(font=Font(bold=True), border=Border(left=thin, right=thin, top=thin, bottom=thin),
+                        alignment=Alignment(horizontal='center', vertical='top'))
+    yellow_fill = PatternFill(start_color="FFFF00", end_color="FFFF00", fill_type="solid")
+
+    header_cells = []
+    for h in headers:
+        cell = WriteOnlyCell(ws, value=h)
+        for attr, style in header_style.items():
+            setattr(cell, attr, style)
+        header_cells.append(cell)
+    ws.append(header_cells)
+    for i, row in enumerate(rows):
+        cols = highlights.get(i)
+        if cols:
+            row = list(row)
+            for col in cols:
+                row[col] = cell = WriteOnlyCell(ws, value=row[col])
+                cell.fill = yellow_fill
+        ws.append(row)
+    workbook.save(output)
+
 
 # --- UI DISPLAY FUNCTIONS ---
-def display_product_card(product, project, visible_attributes):
-    """Display a single product card."""
+def pending_key(product):
+    """pending_changes key for a product: original_index as str (Firestore map keys are strings)."""
+    return str(product["original_index"])
+
+def pending_by_key(project):
+    """Non-empty pending change sets keyed like pending_key() (older int keys normalized once)."""
+    return {str(k): v for k, v in project.get('pending_changes', {}).items() if v}
+
+def writable_attributes(product):
+    """
+    product['attributes'] ready for in-place edits. Unedited products share one dict between
+    'attributes' and 'original_attributes' (no per-row copy at parse/apply/reset); it is split
+    off here, on the first edit, so the originals stay intact.
+    """
+    if product["attributes"] is product["original_attributes"]:
+        product["attributes"] = dict(product["attributes"])
+    return product["attributes"]
+
+def set_pending_field(changes, field, new_val, original_val):
+    """Record field in a product's pending changes, or drop it when back at its original value."""
+    if new_val == original_val:
+        changes.pop(field, None)
+    else:
+        changes[field] = new_val
+
+def card_layout(project, visible_attributes):
+    """
+    Resolve per-rerun card inputs once for all cards: (show_description, show_price,
+    [(attr, label), ...] in project attribute order, pending changes by pending_key()).
+    """
+    visible = set(visible_attributes)
+    attrs = [(attr, attr_label(attr)) for attr in project.get('attributes', []) if attr in visible]
+    return "Description" in visible, "Price" in visible, attrs, pending_by_key(project)
+
+def display_product_card(product, project, layout):
+    """Display a single product card. layout comes from card_layout()."""
+    show_description, show_price, visible_attrs, pending = layout
     with st.container(border=True):
         
         image_html = get_image_html_from_url(
             product_id=product["product_id"], 
-            image_url=product.get("image_url"), 
+            image_url=product.get("thumb_url") or product.get("image_url"), 
             css_width=CARD_IMG_CSS_WIDTH
         )
-        st.markdown(image_html, unsafe_allow_html=True)
         
         # --- Check Pending Changes for Red Highlighting ---
-        idx = product["original_index"]
-        pending = project.get('pending_changes', {})
-        product_changes = pending.get(idx) or pending.get(str(idx)) or {}
+        product_changes = pending.get(pending_key(product), ())
         # --------------------------------------------------
 
-        card_content = ""
+        # Image and text go out as ONE markdown element (one delta per card instead of two)
+        parts = [f'<div style="margin-bottom: 1rem;">{image_html}</div>']
         
         # --- NEW: Always Show Product ID ---
         # This sits above the description in gray text
-        card_content += f'<div style="font-size: 11px; color: #888; margin-bottom: 2px;">ID: {product["product_id"]}</div>'
+        parts.append(f'<div style="font-size: 11px; color: #888; margin-bottom: 2px;">ID: {product["product_id"]}</div>')
         # -----------------------------------
 
-        if "Description" in visible_attributes:
+        if show_description:
             desc_class = "changed-attribute" if "description" in product_changes else ""
-            card_content += f'<p class="{desc_class}" style="margin-bottom: 4px;"><strong>{product["description"]}</strong></p>'
+            parts.append(f'<p class="{desc_class}" style="margin-bottom: 4px;"><strong>{product["description"]}</strong></p>')
         
-        if "Price" in visible_attributes and product.get("price"):
+        if show_price and product.get("price"):
             price_class = "changed-attribute" if "price" in product_changes else ""
-            card_content += f'<p class="{price_class}" style="margin-bottom: 8px;">Price: ${product["price"]}</p>'
+            parts.append(f'<p class="{price_class}" style="margin-bottom: 8px;">Price: ${product["price"]}</p>')
         
         # Attributes Loop
-        for attr in project.get('attributes', []):
-            if attr in visible_attributes:
-                current_val = product["attributes"].get(attr, "N/A")
-                is_changed = attr in product_changes
-                
-                style = 'color: #B22222; font-weight: bold;' if is_changed else ''
-                clean_attr = attr.replace('ATT ', '')
-                
-                card_content += f'<div style="font-size: 12px; line-height: 1.4; {style}"><strong>{clean_attr}:</strong> {current_val}</div>'
+        for attr, clean_attr in visible_attrs:
+            current_val = product["attributes"].get(attr, "N/A")
+            style = 'color: #B22222; font-weight: bold;' if attr in product_changes else ''
+            parts.append(f'<div style="font-size: 12px; line-height: 1.4; {style}"><strong>{clean_attr}:</strong> {current_val}</div>')
         
-        st.markdown(card_content, unsafe_allow_html=True)
+        st.markdown("".join(parts), unsafe_allow_html=True)
 
         if not st.session_state.get("client_mode", False):
-            if st.button(f"Edit", key=f"edit_{product['original_index']}_{project['id']}", use_container_width=True):
-                st.session_state.editing_product = product
-                st.rerun()
+            # Callback, not `if st.button(...): ... st.rerun()`: the click's own rerun already
+            # opens the modal, instead of rendering the page once more just to trigger a second rerun
+            st.button("Edit", key=f"edit_{product['original_index']}_{project['id']}", use_container_width=True,
+                      on_click=start_editing, args=(product,))
+
+def start_editing(product):
+    st.session_state.editing_product = product
 
 def show_edit_modal(product, project):
     @st.dialog(f"Edit Product: {product['product_id']}")
@@ -526,14 +985,18 @@ def show_edit_modal(product, project):
             with attr_cols[i % 2]:
                 current_val = product["attributes"][attr]
                 options = project['filter_options'].get(attr, [])
-                if current_val not in options:
-                    options.insert(0, current_val)
+                # One tuple per attribute; the shared filter_options list itself is never modified here
+                try:
+                    index = options.index(current_val)
+                    choices = (*options, "[Custom Value]")
+                except ValueError:
+                    index = 0
+                    choices = (current_val, *options, "[Custom Value]")
                 
-                clean_attr = attr.replace('ATT ', '')
-                index = options.index(current_val) if current_val in options else 0
+                clean_attr = attr_label(attr)
                 
                 selected_option = st.selectbox(
-                    f"{clean_attr}", options + ["[Custom Value]"], index=index,
+                    f"{clean_attr}", choices, index=index,
                     key=f"modal_attr_{attr}_{product['original_index']}"
                 )
                 
@@ -548,25 +1011,30 @@ def show_edit_modal(product, project):
         st.markdown("---")
         _, save_col, cancel_col, _ = st.columns([1, 1, 1, 1])
         if save_col.button("💾 Save Changes", type="primary", use_container_width=True):
-            idx = product["original_index"]
-            if idx not in project['pending_changes']:
-                project['pending_changes'][idx] = {}
+            # The product's pending entry holds exactly the fields that differ from the
+            # originals, so a value edited back to its original is no longer "changed".
+            key = pending_key(product)
+            changes = project['pending_changes'].pop(key, {})
 
             if new_description != product["description"]:
-                project['pending_changes'][idx]["description"] = new_description
                 product["description"] = new_description
+                set_pending_field(changes, "description", new_description, product["original_description"])
             
             if new_price != product["price"]:
-                project['pending_changes'][idx]["price"] = new_price
                 product["price"] = new_price
+                set_pending_field(changes, "price", new_price, product["original_price"])
             
             for attr, new_val in new_attributes.items():
                 if new_val != product["attributes"][attr]:
-                    project['pending_changes'][idx][attr] = new_val
-                    product["attributes"][attr] = new_val
-                    if new_val not in project['filter_options'].get(attr, []):
-                        project['filter_options'].setdefault(attr, []).append(new_val)
-                        project['filter_options'][attr].sort()
+                    writable_attributes(product)[attr] = new_val
+                    set_pending_field(changes, attr, new_val, product["original_attributes"].get(attr))
+                    attr_options = project['filter_options'].setdefault(attr, [])
+                    pos = bisect.bisect_left(attr_options, new_val)
+                    if pos == len(attr_options) or attr_options[pos] != new_val:
+                        attr_options.insert(pos, new_val)  # kept sorted without a full re-sort
+
+            if changes:
+                project['pending_changes'][key] = changes
             
             update_project_timestamp(project['id'])
             st.success("✅ Changes saved!")
@@ -602,7 +1070,7 @@ def show_projects_page():
                     st.subheader(s.get("name", "Untitled"))
                     if s.get("description"): st.write(s.get("description"))
                     try: lm_disp = datetime.fromisoformat(s['last_modified']).strftime("%Y-%m-%d %H:%M")
-                    except: lm_disp = "—"
+                    except (KeyError, TypeError, ValueError): lm_disp = "—"
                     st.markdown(f"""
                     <div class="project-stats">
                         📦 {s.get("num_products", 0)} products | 
@@ -648,21 +1116,12 @@ def show_create_project_page():
         # --- Match Preview Logic ---
         if uploaded_excel and uploaded_images:
             try:
-                df_preview = pd.read_excel(uploaded_excel)
-                df_preview.columns = [str(c).strip() for c in df_preview.columns]
-                id_col = next((c for c in df_preview.columns if 'product id' in c.lower()), None)
+                # Same cached parse the submit path uses, so the workbook is read once, not twice
+                excel_ids = _excel_product_ids(uploaded_excel.getvalue())
                 
-                if id_col:
-                    excel_ids = set()
-                    for x in df_preview[id_col].dropna():
-                        if isinstance(x, float) and x.is_integer():
-                            excel_ids.add(str(int(x)).strip().lower())
-                        else:
-                            clean_id = str(x).strip().lower()
-                            if clean_id.endswith(".0"): clean_id = clean_id[:-2]
-                            excel_ids.add(clean_id)
+                if excel_ids is not None:
                     
-                    image_names = set(os.path.splitext(img.name)[0].strip().lower() for img in uploaded_images)
+                    image_names = {image_stem(img.name) for img in uploaded_images}
                     
                     matches = excel_ids.intersection(image_names)
                     match_count = len(matches)
@@ -689,11 +1148,7 @@ def show_create_project_page():
                     
                     # 2. Manually match uploaded images
                     if uploaded_images:
-                        product_lookup = {p['product_id'].lower().strip(): p for p in products}
-                        for img in uploaded_images:
-                            fname_id = os.path.splitext(img.name)[0].lower().strip()
-                            if fname_id in product_lookup:
-                                product_lookup[fname_id]['image_data'] = (img.name, img.getvalue())
+                        attach_uploaded_images(products, uploaded_images)
 
                     # 3. Create structure (Updated to remove description argument)
                     project_id = create_new_project(project_name)
@@ -737,6 +1192,7 @@ def show_summary_page():
     project = st.session_state.projects[st.session_state.current_project]
     project_id = project['id']
     is_admin = not st.session_state.get("client_mode", False)
+    show_save_status(project_id)
 
     # --- Header ---
     c1, c2 = st.columns([6, 1])
@@ -749,7 +1205,7 @@ def show_summary_page():
             
     # --- Sidebar: Options & Filters ---
     all_attrs = project.get('attributes', [])
-    clean_attrs = [a.replace('ATT ', '') for a in all_attrs]
+    clean_attrs = [attr_label(a) for a in all_attrs]
     
     with st.sidebar:
         st.header("View Options")
@@ -764,10 +1220,11 @@ def show_summary_page():
         st.divider()
         
         st.header("🔍 Filters")
+        attr_choices, dist_choices = filter_choices(project)
         attribute_filters = {
             attr: st.multiselect(
-                attr.replace('ATT ', ''), 
-                ['All'] + project['filter_options'].get(attr, []), 
+                attr_label(attr), 
+                attr_choices[attr], 
                 default=['All'], 
                 key=f"sum_filt_{attr}"
             ) 
@@ -778,7 +1235,7 @@ def show_summary_page():
         if project['distributions']:
             dist_filters = st.multiselect(
                 "Distribution", 
-                ['All'] + [d.replace('DIST ', '') for d in project['distributions']], 
+                dist_choices, 
                 default=['All'], 
                 key="sum_filt_dist"
             )
@@ -787,33 +1244,21 @@ def show_summary_page():
         status_container = st.container()
 
     # --- Data Processing (With Filters) ---
-    filtered_products = apply_filters(
-        project['products_data'], 
-        attribute_filters, 
-        dist_filters,
-        project.get('pending_changes', {}),
-        False 
-    )
-
-    df = pd.DataFrame(filtered_products)
+    stats = get_summary_stats(project, attribute_filters, dist_filters)
     
-    if df.empty:
+    if not stats['n']:
         st.warning("No product data matches the current filters.")
         return
 
-    if 'attributes' in df.columns:
-        attr_df = pd.DataFrame(list(df['attributes']))
-        df = pd.concat([df.drop('attributes', axis=1), attr_df], axis=1)
-
     pending_renames = [] 
     
-    st.markdown(f"### Showing {len(df)} Products")
+    st.markdown(f"### Showing {stats['n']} Products")
 
     # --- 1. Attribute Charts (Rendered First) ---
     for attr in selected_attrs:
         with st.container(border=True):
             col_header, _ = st.columns([3, 1])
-            original_attr_name = attr.replace('ATT ', '')
+            original_attr_name = attr_label(attr)
             
             if is_admin:
                 new_attr_name_input = st.text_input(
@@ -831,10 +1276,10 @@ def show_summary_page():
 
             c_chart, c_data = st.columns([1, 1])
             
+            attr_counts = stats['counts'].get(attr, {})
             with c_chart:
-                if attr in df.columns:
-                    counts = df[attr].value_counts().reset_index()
-                    counts.columns = ['Option', 'Count']
+                if attr in stats['counts']:
+                    counts = pd.DataFrame({'Option': list(attr_counts), 'Count': list(attr_counts.values())})
                     if not counts.empty:
                         fig = px.pie(counts, values='Count', names='Option', hole=0.4)
                         
@@ -847,7 +1292,7 @@ def show_summary_page():
 
             with c_data:
                 st.write("**Edit Option Names**" if is_admin else "**Options Legend**")
-                options = sorted(list(df[attr].dropna().unique())) if attr in df.columns else []
+                options = sorted(attr_counts)
                 
                 container = st.container()
                 if len(options) > 10:
@@ -857,8 +1302,7 @@ def show_summary_page():
                     for val in options:
                         if is_admin:
                             c_opt_1, c_opt_2 = st.columns([3, 7])
-                            count = len(df[df[attr]==val])
-                            c_opt_1.write(f"{val} ({count})")
+                            c_opt_1.write(f"{val} ({attr_counts[val]})")
                             
                             new_val = c_opt_2.text_input(
                                 "Rename", value=val, key=f"rename_val_{attr}_{val}", label_visibility="collapsed"
@@ -866,13 +1310,11 @@ def show_summary_page():
                             if new_val != val:
                                 pending_renames.append(("OPTION", val, new_val, attr))
                         else:
-                            count = len(df[df[attr]==val])
-                            st.write(f"- {val} ({count})")
+                            st.write(f"- {val} ({attr_counts[val]})")
 
     # --- 2. Price Distribution (Moved to Bottom) ---
-    if 'price' in df.columns:
-        df['price_num'] = pd.to_numeric(df['price'], errors='coerce')
-        valid_prices = df.dropna(subset=['price_num'])
+    if len(stats['prices']):
+        valid_prices = pd.DataFrame({'price_num': stats['prices']})
         
         if not valid_prices.empty:
             with st.container(border=True):
@@ -897,9 +1339,9 @@ def show_summary_page():
             if st.button("💾 SAVE ALL CHANGES", type="primary", use_container_width=True):
                 with st.spinner("Saving changes..."):
                     apply_bulk_renames(project, pending_renames)
-                    auto_save_project(project_id)
+                    auto_save_project(project_id, background=True)
                     update_project_timestamp(project_id)
-                    st.success("Saved!")
+                    st.success("Changes applied. Saving to the cloud...")
                     time.sleep(1)
                     st.rerun()
 
@@ -975,6 +1417,17 @@ def apply_bulk_renames(project, renames):
                 view_opts['sort_by'] = new_attr
 
 
+def clear_grid_state(project_id, view_options=False):
+    """
+    Forget a project's grid paging state; with view_options=True also its view/sort selection
+    and the Show Attributes widget state, so a replaced grid starts from the defaults.
+    """
+    keys = [f'page_number_{project_id}', f'page_number_{project_id}_view']
+    if view_options:
+        keys += [f'view_options_{project_id}', f'ms_vis_attr_{project_id}']
+    for key in keys:
+        st.session_state.pop(key, None)
+
 def show_grid_page():
     """Display the product grid for the current project."""
     if not st.session_state.current_project or st.session_state.current_project not in st.session_state.projects:
@@ -985,8 +1438,9 @@ def show_grid_page():
     project = st.session_state.projects[st.session_state.current_project]
     project_id = project['id']
     is_admin = not st.session_state.get("client_mode", False)
+    show_save_status(project_id)
 
-    PRODUCTS_PER_PAGE = 50
+    PRODUCTS_PER_PAGE = 24  # whole rows of the 4-column grid; only this many cards render per run
     page_state_key = f'page_number_{project_id}'
     if page_state_key not in st.session_state:
         st.session_state[page_state_key] = 1
@@ -994,13 +1448,16 @@ def show_grid_page():
     def increment_page(): st.session_state[page_state_key] += 1
     def decrement_page(): st.session_state[page_state_key] -= 1
 
-    def render_pagination_controls(total_pages):
+    def render_pagination_controls(total_pages, position="top"):
         current_page = st.session_state[page_state_key]
         st.write("---")
         p_col1, p_col2, p_col3 = st.columns([1, 2, 1])
-        p_col1.button("⬅️ Previous", on_click=decrement_page, disabled=(current_page <= 1), key="prev_top", use_container_width=True)
-        p_col2.selectbox(f"Page {current_page} of {total_pages}", range(1, total_pages + 1), key=page_state_key, label_visibility="collapsed")
-        p_col3.button("Next ➡️", on_click=increment_page, disabled=(current_page >= total_pages), key="next_top", use_container_width=True)
+        p_col1.button("⬅️ Previous", on_click=decrement_page, disabled=(current_page <= 1), key=f"prev_{position}", use_container_width=True)
+        if position == "top":
+            p_col2.selectbox(f"Page {current_page} of {total_pages}", range(1, total_pages + 1), key=page_state_key, label_visibility="collapsed")
+        else:
+            p_col2.markdown(f"<p style='text-align: center;'>Page {current_page} of {total_pages}</p>", unsafe_allow_html=True)
+        p_col3.button("Next ➡️", on_click=increment_page, disabled=(current_page >= total_pages), key=f"next_{position}", use_container_width=True)
         st.write("---")
 
     h_col1, h_col2, h_col3, h_col4 = st.columns([4, 3, 3, 2])
@@ -1031,7 +1488,7 @@ def show_grid_page():
     
     with h_col3:
         st.markdown("<div><br></div>", unsafe_allow_html=True)
-        excel_data = create_download_excel(project)
+        excel_data = get_download_excel(project)
         if excel_data:
             st.download_button("📥 Download Current Grid", excel_data, f"{project['name']}_updated.xlsx", use_container_width=True)
     
@@ -1041,8 +1498,7 @@ def show_grid_page():
             if st.button("← Back to Projects", use_container_width=True):
                 st.session_state.page = 'projects'
                 st.query_params.clear()
-                if page_state_key in st.session_state:
-                    del st.session_state[page_state_key]
+                clear_grid_state(project_id)
                 st.rerun()
 
     if is_admin and 'new_excel' in locals() and new_excel:
@@ -1052,12 +1508,10 @@ def show_grid_page():
                 'products_data': products, 'attributes': attrs, 'distributions': dists,
                 'filter_options': filters, 'excel_filename': new_excel.name, 'pending_changes': {}
             })
-            view_options_key = f'view_options_{project_id}'
-            if view_options_key in st.session_state:
-                del st.session_state[view_options_key]
+            clear_grid_state(project_id, view_options=True)
             update_project_timestamp(project_id)
-            auto_save_project(project_id)
-            st.success(f"Project updated with '{new_excel.name}'. Reloading...")
+            auto_save_project(project_id, background=True)
+            st.success(f"Project updated with '{new_excel.name}'. Saving to the cloud...")
             
             # --- FIX: Increment version to force a fresh uploader widget ---
             st.session_state[excel_ver_key] += 1
@@ -1075,34 +1529,30 @@ def show_grid_page():
                     # --- NEW: Save pending changes to 'last_applied' history before clearing ---
                     # This allows the Excel download to know what was just updated.
                     project['last_applied_changes'] = project['pending_changes'].copy()
+                    pending = pending_by_key(project)
                     
                     for product in project['products_data']:
-                        # Handle string/int key differences
-                        idx = product['original_index']
-                        changes = project['pending_changes'].get(idx) or project['pending_changes'].get(str(idx))
-                        
-                        if changes:
+                        if pending_key(product) in pending:
                             product['original_description'] = product['description']
                             product['original_price'] = product['price']
-                            product['original_attributes'] = product['attributes'].copy()
+                            product['original_attributes'] = product['attributes']
                     
                     project['pending_changes'] = {}
                     update_project_timestamp(project_id)
-                    auto_save_project(project_id)
-                    st.success("Saved! These changes will now be highlighted in the Excel download.")
+                    auto_save_project(project_id, background=True)
+                    st.success("Applied! These changes will now be highlighted in the Excel download. Saving to the cloud...")
                     time.sleep(1); st.rerun()
         with action_cols[1]:
             if st.button("❌ Reset All Changes", use_container_width=True):
                 with st.spinner("Reverting..."):
+                    pending = pending_by_key(project)
                     for product in project['products_data']:
-                        idx = product['original_index']
-                        changes = project['pending_changes'].get(idx) or project['pending_changes'].get(str(idx))
-                        
-                        if changes:
+                        if pending_key(product) in pending:
                             product['description'] = product['original_description']
                             product['price'] = product['original_price']
-                            product['attributes'] = product['original_attributes'].copy()
+                            product['attributes'] = product['original_attributes']
                     project['pending_changes'] = {}
+                    bump_project_version(project)
                     st.warning("Discarded."); time.sleep(1); st.rerun()
 
     if is_admin:
@@ -1125,21 +1575,25 @@ def show_grid_page():
             
             if new_images:
                 with st.spinner(f"Matching {len(new_images)} image(s)..."):
-                    product_lookup = {p['product_id'].lower().strip(): p for p in project['products_data']}
-                    updated_count = 0
-                    for image_file in new_images:
-                        pid = os.path.splitext(image_file.name)[0].lower().strip()
-                        if pid in product_lookup:
-                            product_lookup[pid]['image_data'] = (image_file.name, image_file.getvalue())
-                            updated_count += 1
+                    matched = attach_uploaded_images(project['products_data'], new_images)
+                    updated_count = len(matched)
                     if updated_count > 0:
                         st.text(f"Found {updated_count} matches. Uploading...")
                         updated_mappings = auto_save_project(project_id)
-                        if updated_mappings:
+                        if updated_mappings == SAVE_CONFLICT:
+                            # Reset the uploader (no retry loop); the conflict notice offers the reload
+                            st.session_state[img_ver_key] += 1
+                            st.rerun(); return
+                        elif updated_mappings:
                             project['image_mappings'] = updated_mappings
-                            for p_id, p_data in product_lookup.items():
-                                if p_id in updated_mappings and "public_url" in updated_mappings[p_id]:
-                                    p_data['image_url'] = updated_mappings[p_id]["public_url"]
+                            for p_data in matched:
+                                meta = updated_mappings.get(p_data['product_id'].lower().strip(), {})
+                                if "public_url" in meta:
+                                    p_data['image_url'] = meta["public_url"]
+                                    if "thumb_url" in meta:
+                                        p_data['thumb_url'] = meta["thumb_url"]
+                                    else:
+                                        p_data.pop('thumb_url', None)  # belonged to the replaced image
                             st.success(f"✅ Added {updated_count} image(s).")
                             
                             # --- 3. INCREMENT VERSION: This forces the uploader to reset ---
@@ -1152,46 +1606,44 @@ def show_grid_page():
         show_edit_modal(st.session_state.editing_product, project)
 
     with st.container(border=True):
-        st.markdown("""<style>.stMultiSelect div[data-baseweb="select"] > div:first-child {max-height: 100px; overflow-y: auto;} .stMultiSelect [data-baseweb="tag"] span {font-size: 12px !important;}</style>""", unsafe_allow_html=True)
-        
-        if f'view_options_{project_id}' not in st.session_state:
-            st.session_state[f'view_options_{project_id}'] = {'visible_attributes': ['Description', 'Price'] + project['attributes'], 'sort_by': 'product_id', 'sort_ascending': True}
-        view_options = st.session_state[f'view_options_{project_id}']
+        all_fields, s_opts = view_fields(project)
+        view_options = st.session_state.setdefault(
+            f'view_options_{project_id}',
+            {'visible_attributes': list(all_fields), 'sort_by': 'product_id', 'sort_ascending': True}
+        )
         
-        all_fields = ['Description', 'Price'] + project['attributes']
-        def fmt(name): return name.replace('ATT ', '')
+        fmt = attr_label
         
         st.markdown('<p style="font-size: 1.1rem; font-weight: bold; margin-top: -5px; margin-bottom: 5px;">View & Sort Options</p>', unsafe_allow_html=True)
-        v_col1, v_col2 = st.columns(2)
-        v_col1.markdown("<p style='font-size: 13px; font-weight: bold; margin-bottom: 0px;'>Show Attributes:</p>", unsafe_allow_html=True)
+        # One rerun per "Apply View" instead of one per click while picking fields/sort.
+        # The widgets carry their own (bold) labels: no separate markdown element per label.
+        with st.form(f"view_controls_{project_id}", border=False):
+            v_col1, v_col2 = st.columns(2)
         
-        # --- FIX: Add Key & Safety Check ---
-        ms_key = f"ms_vis_attr_{project_id}"
+            # --- FIX: Add Key & Safety Check ---
+            ms_key = f"ms_vis_attr_{project_id}"
         
-        # Safety: If the widget state contains old/invalid attributes (e.g. after a rename), 
-        # force a reset to the source of truth (view_options) to prevent a crash.
-        if ms_key in st.session_state:
-            current_selection = st.session_state[ms_key]
-            if not set(current_selection).issubset(set(all_fields)):
-                del st.session_state[ms_key]
-
-        view_options['visible_attributes'] = v_col1.multiselect(
-            "Show Attributes:", 
-            all_fields, 
-            default=view_options['visible_attributes'], 
-            format_func=fmt, 
-            label_visibility="collapsed",
-            key=ms_key  # Adding this key fixes the "double click" issue
-        )
-        # -----------------------------------
+            # Safety: If the widget state contains old/invalid attributes (e.g. after a rename), 
+            # force a reset to the source of truth (view_options) to prevent a crash.
+            if ms_key in st.session_state:
+                current_selection = st.session_state[ms_key]
+                if not set(current_selection).issubset(all_fields):
+                    del st.session_state[ms_key]
+
+            view_options['visible_attributes'] = v_col1.multiselect(
+                "**Show Attributes:**", 
+                all_fields, 
+                default=view_options['visible_attributes'], 
+                format_func=fmt, 
+                key=ms_key  # Adding this key fixes the "double click" issue
+            )
+            # -----------------------------------
         
-        s_opts = ['product_id'] + all_fields
-        s_col1, s_col2 = v_col2.columns([2,1])
-        s_col1.markdown("<p style='font-size: 13px; font-weight: bold; margin-bottom: 0px;'>Sort By:</p>", unsafe_allow_html=True)
-        sort_by_index = s_opts.index(view_options['sort_by']) if view_options['sort_by'] in s_opts else 0
-        view_options['sort_by'] = s_col1.selectbox("Sort By:", s_opts, index=sort_by_index, format_func=fmt, label_visibility="collapsed")
-        s_col2.markdown("<p style='font-size: 13px; font-weight: bold; margin-bottom: 0px;'>Order:</p>", unsafe_allow_html=True)
-        view_options['sort_ascending'] = s_col2.radio("Order:", ["🔼", "🔽"], horizontal=True, index=0 if view_options['sort_ascending'] else 1, label_visibility="collapsed") == "🔼"
+            s_col1, s_col2 = v_col2.columns([2,1])
+            sort_by_index = s_opts.index(view_options['sort_by']) if view_options['sort_by'] in s_opts else 0
+            view_options['sort_by'] = s_col1.selectbox("**Sort By:**", s_opts, index=sort_by_index, format_func=fmt)
+            view_options['sort_ascending'] = s_col2.radio("**Order:**", ["🔼", "🔽"], horizontal=True, index=0 if view_options['sort_ascending'] else 1) == "🔼"
+            st.form_submit_button("Apply View")
         
     with st.sidebar:
         if is_admin:
@@ -1208,54 +1660,77 @@ def show_grid_page():
         show_pending_only = st.checkbox("Show Pending Changes Only", value=False)
         st.divider()
         
-        attribute_filters = {attr: st.multiselect(attr.replace('ATT ', ''), ['All'] + project['filter_options'].get(attr, []), default=['All']) for attr in project['attributes']}
-        dist_filters = st.multiselect("Distribution", ['All'] + [d.replace('DIST ', '') for d in project['distributions']], default=['All']) if project['distributions'] else []
-
-    filtered_products = apply_filters(
-        project['products_data'], 
-        attribute_filters, 
-        dist_filters,
-        project.get('pending_changes', {}),
-        show_pending_only
+        # Selections inside the form are only committed on submit, so picking several values costs one rerun
+        attr_choices, dist_choices = filter_choices(project)
+        with st.form("grid_filters", border=False):
+            attribute_filters = {attr: st.multiselect(attr_label(attr), attr_choices[attr], default=['All']) for attr in project['attributes']}
+            dist_filters = st.multiselect("Distribution", dist_choices, default=['All']) if project['distributions'] else []
+            st.form_submit_button("Apply Filters", use_container_width=True)
+
+    # Only positions are carried around; product dicts are looked up for the visible page alone
+    sorted_indices = get_filtered_indices(
+        project, attribute_filters, dist_filters, show_pending_only,
+        sort_by=view_options['sort_by'], ascending=view_options['sort_ascending']
     )
-    
-    sort_by, is_ascending = view_options['sort_by'], view_options['sort_ascending']
-    def get_sort_key(p):
-        if sort_by == 'product_id': return int(p['product_id']) if p['product_id'].isdigit() else p['product_id']
-        if sort_by == 'Description': return p['description'].lower()
-        if sort_by == 'Price': return float(p.get('price', 0))
-        return p['attributes'].get(sort_by, '').lower()
-    
-    sorted_products = sorted(filtered_products, key=get_sort_key, reverse=not is_ascending)
-    st.markdown(f"### Showing {len(sorted_products)} of {len(project['products_data'])} products")
+    st.markdown(f"### Showing {len(sorted_indices)} of {len(project['products_data'])} products")
 
-    total_pages = max(1, (len(sorted_products) + PRODUCTS_PER_PAGE - 1) // PRODUCTS_PER_PAGE)
+    total_pages = max(1, (len(sorted_indices) + PRODUCTS_PER_PAGE - 1) // PRODUCTS_PER_PAGE)
+    # A different filter/sort selection starts again at page 1 instead of landing mid-way through new results
+    view_signature = (repr(attribute_filters), repr(dist_filters), show_pending_only, view_options['sort_by'], view_options['sort_ascending'])
+    if st.session_state.get(f'{page_state_key}_view') != view_signature:
+        st.session_state[f'{page_state_key}_view'] = view_signature
+        st.session_state[page_state_key] = 1
     current_page = st.session_state[page_state_key] = min(st.session_state.get(page_state_key, 1), total_pages)
     
     if total_pages > 1: render_pagination_controls(total_pages)
         
     start_idx = (current_page - 1) * PRODUCTS_PER_PAGE
-    products_to_display = sorted_products[start_idx : start_idx + PRODUCTS_PER_PAGE]
+    products_to_display = [project['products_data'][i] for i in sorted_indices[start_idx : start_idx + PRODUCTS_PER_PAGE]]
     
     if products_to_display:
+        layout = card_layout(project, view_options['visible_attributes'])
         for i in range(0, len(products_to_display), 4):
             cols = st.columns(4)
             for j, product in enumerate(products_to_display[i : i + 4]):
                 with cols[j]:
-                    display_product_card(product, project, view_options['visible_attributes'])
+                    display_product_card(product, project, layout)
+        if total_pages > 1: render_pagination_controls(total_pages, position="bottom")
     else:
         st.info("No products match the current filters.")
         
 # --- MAIN APP ROUTER ---
-def auto_save_project(project_id):
+def auto_save_project(project_id, background=False):
     """
     Save current project to Firestore and return the result from the save operation.
+    With background=True the save is queued (debounced) and True is returned right away.
     """
     if st.session_state.get('firestore_manager'):
         project = st.session_state.projects[project_id]
-        return st.session_state.firestore_manager.save_project(project_id, project)
+        if background:
+            queue_project_save(st.session_state.firestore_manager, project_id, project)
+            return True
+        return save_project_now(st.session_state.firestore_manager, project_id, project)
     return False
 
+@st.fragment(run_every=SAVE_STATUS_POLL_SECONDS)
+def show_save_status(project_id):
+    """Progress of this project's background saves; on a conflict, offers to reload the stored version."""
+    status = get_save_status(project_id)
+    if status in ("queued", "saving"):
+        st.caption("☁️ Saving changes...")
+    elif status == "saved":
+        st.caption("✅ All changes saved")
+    elif status == "failed":
+        st.error("❌ Your last changes could not be saved.")
+        if st.button("🔁 Retry save", key=f"retry_save_{project_id}"):
+            auto_save_project(project_id, background=True)
+            st.rerun(scope="fragment")
+    elif status == "conflict":
+        st.error("⚠️ This project was changed by someone else, so your last changes were not saved.")
+        if st.button("🔄 Reload project", key=f"reload_{project_id}"):
+            if reload_project(project_id):
+                st.rerun()
+
 def main():
     """Main application router."""
     # 1. Determine Mode
@@ -1265,7 +1740,7 @@ def main():
     # 2. Load Project from URL if present
     if "project" in st.query_params and not st.session_state.current_project:
         target_project_id = st.query_params["project"]
-        if ensure_project_loaded(target_project_id):
+        if ensure_project_loaded(target_project_id, read_only=st.session_state.client_mode):
             st.session_state.current_project = target_project_id
             st.session_state.page = 'grid'
         else: